@@ -5,55 +5,166 @@ Two agents discuss a user-assigned topic back and forth.
 
 import re
 import os
-from dotenv import load_dotenv
 from typing import Annotated, Literal
 from typing_extensions import TypedDict
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import merge_configs
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-load_dotenv()
+from llm_cache import enable_llm_cache
+from models import create_chat_model, register_model, get_model, load_env
+from model_calls import invoke_model, ainvoke_model, stream_model, astream_model
+from message_archive import append_messages, append_metrics
+from provider_pools import provider_slot
+from hedging import hedged_call, ahedged_call
+from speakers import AGENT_1, AGENT_2, SUMMARIZER, LABELS, SPEAKER_LABEL, LEADING_AGENT_LABEL, speaker_of, message_text, labelled_text
+load_env()
 
 openai_key = os.getenv("OPENAI_API_KEY")
 
 anthropic_key = os.getenv("ANTHROPIC_API_KEY")
 perplexity_key = os.getenv("PERPLEXITY_API_KEY")
+PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
+
+# Opt-in on-disk response cache shared by every model in the process
+if os.getenv("LLM_CACHE_PATH"):
+    enable_llm_cache(os.getenv("LLM_CACHE_PATH"), max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")))
+
+# Metrics update entry that drops that many records from the front of the list once they are archived
+ARCHIVED_METRICS = "archived_metrics"
+
+
+def add_metrics(current: list, update: list) -> list:
+    """Append metrics records, applying any {ARCHIVED_METRICS: n} entries in the update.
+
+    Records are only archived from the front of the list, so a turn's
+    records appended in the same step as a compaction are kept.
+    """
+    merged = list(current)
+    for record in update:
+        if ARCHIVED_METRICS in record:
+            del merged[:record[ARCHIVED_METRICS]]
+        else:
+            merged.append(record)
+    return merged
+
 
 # Define state for the conversation
 class ConversationState(TypedDict):
     """State for tracking the two-agent conversation."""
     messages: Annotated[list, add_messages]
+    # Each agent's history, cleaned of labels and role-tagged from its side (own turns as AI,
+    # the other agent's as Human); appended once per turn so prompts just slice them
+    agent_1_view: Annotated[list, add_messages]
+    agent_2_view: Annotated[list, add_messages]
     topic: str
     current_speaker: Literal["agent_1", "agent_2", "summarizer"]
     turn_count: int
     max_turns: int
     summary_interval: int  # How often to summarize (every N turns)
+    context_window: int  # Agent turns kept verbatim in prompts (0 = full history)
+    archive_path: str  # JSONL file older messages are compacted into (needs context_window)
+    background_summary: bool  # Summarize alongside the next agent turn instead of before it
+    transcript_path: str  # Set once the finished conversation's transcript and summary are written
+    metrics: Annotated[list, add_metrics]  # One timing/token record per model call (older ones archived)
+
+
+# Models - Agent 1 uses GPT-4o, Agent 2 uses Perplexity
+# (all three are swapped for offline fakes when LLM_BACKEND=fake)
+# AGENT1_PROVIDER=anthropic runs Agent 1 on Claude with prompt caching instead
+# Each is built on first use in a node, so importing the graph creates no clients
+agent1_provider = os.getenv("AGENT1_PROVIDER", "openai")
+
+
+def _build_model_agent1():
+    if agent1_provider == "anthropic":
+        return create_chat_model(
+            model=os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-5"),
+            api_key=anthropic_key,
+            provider="anthropic"
+        )
+    return create_chat_model(
+        model="gpt-4o",
+        api_key=openai_key
+    )
 
 
-# Initialize models - Agent 1 uses GPT-4o, Agent 2 uses Perplexity
-model_agent1 = ChatOpenAI(
-    model="gpt-4o",
-    api_key=openai_key
-)
+def _build_model_agent2():
+    # Perplexity uses OpenAI-compatible API
+    return create_chat_model(
+        model="sonar",  # Perplexity's default model
+        api_key=perplexity_key,
+        base_url=PERPLEXITY_BASE_URL
+    )
 
 
-# Perplexity uses OpenAI-compatible API
-model_agent2 = ChatOpenAI(
-    model="sonar",  # Perplexity's default model
-    api_key=perplexity_key,
-    base_url="https://api.perplexity.ai"
-)
+def _build_model_summarizer():
+    # Summarizer agent - uses GPT-4o-mini
+    return create_chat_model(
+        model="gpt-4o-mini",
+        api_key=openai_key,
+        temperature=0.3
+    )
 
-# Summarizer agent - uses GPT-4o 
-model_summarizer = ChatOpenAI(
-    model="gpt-4o-mini",
-    api_key=openai_key,
-    temperature=0.3  
-)
 
-def clean_response_content(response) -> str:
-    """Extract and clean content from LLM response."""
+HEDGE_FALLBACK = "hedge_fallback"
+
+
+def _build_model_hedge_fallback():
+    # OpenAI model that hedged requests are sent to instead of a duplicate of the original
+    return create_chat_model(
+        model=os.getenv("HEDGE_FALLBACK_MODEL"),
+        api_key=openai_key
+    )
+
+
+register_model(AGENT_1, _build_model_agent1)
+register_model(AGENT_2, _build_model_agent2)
+register_model(SUMMARIZER, _build_model_summarizer)
+register_model(HEDGE_FALLBACK, _build_model_hedge_fallback)
+
+# Module attributes kept for code that imports the models directly
+_MODEL_ATTRIBUTES = {"model_agent1": AGENT_1, "model_agent2": AGENT_2, "model_summarizer": SUMMARIZER}
+
+
+def __getattr__(name):
+    if name in _MODEL_ATTRIBUTES:
+        return get_model(_MODEL_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Stop sequences that end a turn once a model starts writing another speaker's part
+AGENT_STOP_SEQUENCES = {
+    AGENT_1: [LABELS[AGENT_2], LABELS[SUMMARIZER], f"\n{LABELS[AGENT_1]}"],
+    AGENT_2: [LABELS[AGENT_1], LABELS[SUMMARIZER], f"\n{LABELS[AGENT_2]}"]
+}
+
+# AGENT_STREAMING=1 streams agent turns and cancels them at the first foreign label,
+# for providers that ignore stop sequences
+stream_agent_responses = os.getenv("AGENT_STREAMING", "0") == "1"
+
+
+# What a response may open with before its leading "[Agent N]:" label is complete
+_LEADING_LABELS = tuple(f"{LABELS[speaker]}:" for speaker in (AGENT_1, AGENT_2))
+
+
+def has_foreign_label(text: str) -> bool:
+    """True once a response contains a speaker label after its optional leading one."""
+    opening = text.lstrip()
+    if any(label.startswith(opening) for label in _LEADING_LABELS):
+        # Still possibly streaming the model's own leading label (e.g. "[Agent 1]" before its colon)
+        return False
+    return SPEAKER_LABEL.search(LEADING_AGENT_LABEL.sub('', text, count=1)) is not None
+
+
+def clean_response_content(response, truncate_at_labels: bool = True) -> str:
+    """Extract and clean content from LLM response.
+
+    Agent turns are cut at the first speaker label after the leading one;
+    with truncate_at_labels=False (summaries, which may quote labels) only a
+    trailing "\n[Agent N]:" turn is removed.
+    """
     # Extract content based on type
     if isinstance(response.content, str):
         content = response.content
@@ -67,14 +178,151 @@ def clean_response_content(response) -> str:
     else:
         content = str(response.content)
 
-    # Remove agent labels and clean whitespace
-    content = re.sub(r'^\[Agent \d\]:\s*', '', content)
-    content = re.sub(r'\n\[Agent \d\]:\s*.*$', '', content, flags=re.DOTALL)
+    # Remove the leading agent label, drop anything from another speaker's label on
+    content = LEADING_AGENT_LABEL.sub('', content, count=1)
+    if truncate_at_labels:
+        label = SPEAKER_LABEL.search(content)
+        if label:
+            content = content[:label.start()]
+    else:
+        content = re.sub(r'\n\[Agent \d\]:\s*.*$', '', content, flags=re.DOTALL)
     return content.strip()
 
 
-def agent_1_node(state: ConversationState) -> dict:
-    """Agent 1's turn to speak."""
+def _hedge_backup():
+    """Model for hedged duplicate requests, or None to repeat the request on the same model."""
+    return get_model(HEDGE_FALLBACK) if os.getenv("HEDGE_FALLBACK_MODEL") else None
+
+
+def _agent_calls(messages: list, node: str, config=None):
+    """Sync and async functions running one agent turn on a given model."""
+    stop = AGENT_STOP_SEQUENCES[node]
+
+    def call(model):
+        if stream_agent_responses:
+            return stream_model(model, messages, node, config, stop_when=has_foreign_label, stop=stop)
+        return invoke_model(model, messages, node, config, stop=stop)
+
+    async def acall(model, on_first_token=None, extra_config=None):
+        call_config = merge_configs(config, extra_config)
+        if stream_agent_responses:
+            return await astream_model(model, messages, node, call_config, stop_when=has_foreign_label, on_first_token=on_first_token, stop=stop)
+        return await ainvoke_model(model, messages, node, call_config, on_first_token=on_first_token, stop=stop)
+
+    return call, acall
+
+
+def _call_agent(model, messages: list, node: str, config=None):
+    """Run one agent turn with stop sequences, streaming it when AGENT_STREAMING is set.
+
+    Slow turns are hedged when HEDGE_PERCENTILE or HEDGE_DEADLINE_MS is set (see hedging).
+    """
+    call, acall = _agent_calls(messages, node, config)
+    return hedged_call(node, call, acall, model, _hedge_backup())
+
+
+async def _acall_agent(model, messages: list, node: str, config=None):
+    """Async version of _call_agent."""
+    _, acall = _agent_calls(messages, node, config)
+    return await ahedged_call(node, acall, model, _hedge_backup())
+
+
+def _summarizer_calls(messages: list, config=None):
+    """Sync and async functions running one periodic summary on a given model."""
+
+    def call(model):
+        return invoke_model(model, messages, "summarizer", config)
+
+    async def acall(model, on_first_token=None, extra_config=None):
+        return await ainvoke_model(model, messages, "summarizer", merge_configs(config, extra_config), on_first_token=on_first_token)
+
+    return call, acall
+
+
+def _call_summarizer(messages: list, config=None):
+    """Run one periodic summary, hedged like agent turns."""
+    call, acall = _summarizer_calls(messages, config)
+    return hedged_call("summarizer", call, acall, get_model(SUMMARIZER), _hedge_backup())
+
+
+async def _acall_summarizer(messages: list, config=None):
+    """Async version of _call_summarizer."""
+    _, acall = _summarizer_calls(messages, config)
+    return await ahedged_call("summarizer", acall, get_model(SUMMARIZER), _hedge_backup())
+
+
+def _latest_summary(messages: list):
+    """Return the text of the most recent summarizer message, or None."""
+    for msg in reversed(messages):
+        if speaker_of(msg) == SUMMARIZER:
+            return message_text(msg)
+    return None
+
+
+def _windowed_view(state: ConversationState, view_key: str):
+    """Split an agent's view into (latest summary text, last context_window turns).
+
+    Turns older than the window are represented only by the most recent
+    periodic summary, which is cumulative when a window is set (see
+    _summarizer_prompt), so prompt size stays bounded however long the
+    conversation runs. Turns dropped since the last summary are not covered
+    until the next one; keep context_window >= summary_interval so there are
+    none. With no window, or when everything fits, the full view is returned
+    with no summary.
+    """
+    view = state.get(view_key, [])
+    context_window = state.get("context_window", 0)
+    if not context_window or len(view) <= context_window:
+        return None, list(view)
+    return _latest_summary(state["messages"]), view[-context_window:]
+
+
+def _view_prompt(lead: list, summary, history: list) -> list:
+    """Put leading user text and the summary of dropped turns before an agent's view.
+
+    They are merged with a leading Human turn so user/assistant roles keep
+    alternating; with nothing to lead, a leading AI turn is dropped instead.
+    """
+    if summary is not None:
+        lead = lead + [f"Summary of the earlier discussion: {summary}"]
+    if history and isinstance(history[0], HumanMessage) and lead:
+        lead = lead + [history[0].content]
+        history = history[1:]
+    elif not lead and history and isinstance(history[0], AIMessage):
+        history = history[1:]
+    if lead:
+        return [HumanMessage(content="\n\n".join(lead))] + history
+    return history
+
+
+def _with_turn_note(messages: list, turn_count: int, max_turns: int) -> list:
+    """Add the per-turn position after the stable prefix (system prompt + history).
+
+    Keeping the changing values last lets provider-side prefix caching reuse
+    everything before them. The note is folded into a trailing user message
+    so user/assistant roles keep alternating.
+    """
+    note = f"This is turn {turn_count} of {max_turns}."
+    last = messages[-1]
+    if isinstance(last, HumanMessage):
+        return messages[:-1] + [HumanMessage(content=f"{last.content}\n\n{note}")]
+    return messages + [HumanMessage(content=note)]
+
+
+def _with_cache_breakpoints(messages: list) -> list:
+    """Mark the system prompt and the last history message as Anthropic cache breakpoints."""
+    marked = list(messages)
+    for index in {0, len(marked) - 2}:
+        message = marked[index]
+        if isinstance(message.content, str):
+            marked[index] = message.model_copy(update={"content": [
+                {"type": "text", "text": message.content, "cache_control": {"type": "ephemeral"}}
+            ]})
+    return marked
+
+
+def _agent_1_prompt(state: ConversationState) -> list:
+    """Build Agent 1's prompt from the conversation so far."""
     # Get turn count with default value
     turn_count = state.get('turn_count', 0)
     max_turns = state.get('max_turns', 8)
@@ -89,34 +337,52 @@ Important guidelines:
 - Provide only YOUR response, not the entire conversation
 - Share your perspective, ask questions, and engage meaningfully
 - Keep your response concise (2-4 sentences)
-- MAXIMUM 100 WORDS - keep your response brief and focused
+- MAXIMUM 100 WORDS - keep your response brief and focused"""
 
-This is turn {turn_count} of {max_turns}."""
-
-    # Prepare messages
+    # Prepare messages - stable prefix first, per-turn values last
+    summary, history = _windowed_view(state, "agent_1_view")
     messages = [SystemMessage(content=system_prompt)]
+    messages.extend(_view_prompt([f"Begin the discussion about: {state['topic']}"], summary, history))
 
-    if state["messages"]:
-        messages.extend(state["messages"])
-    else:
-        messages.append(HumanMessage(content=f"Begin the discussion about: {state['topic']}"))
+    messages = _with_turn_note(messages, turn_count, max_turns)
+    if agent1_provider == "anthropic":
+        messages = _with_cache_breakpoints(messages)
+    return messages
 
-    # Get response and clean
-    response = model_agent1.invoke(messages)
+
+def _agent_1_update(state: ConversationState, response, record: dict) -> dict:
+    """Turn Agent 1's model response into a state update."""
+    turn_count = state.get('turn_count', 0)
     content = clean_response_content(response)
 
     if not content:
         content = "I'd like to hear your thoughts on this topic."
 
     return {
-        "messages": [AIMessage(content=f"[Agent 1]: {content}")],
+        "messages": [AIMessage(content=content, name=AGENT_1)],
+        "agent_1_view": [AIMessage(content=content)],
+        "agent_2_view": [HumanMessage(content=content)],
         "current_speaker": "agent_2",
-        "turn_count": turn_count + 1
+        "turn_count": turn_count + 1,
+        "metrics": [{**record, "turn": turn_count + 1}]
     }
 
 
-def agent_2_node(state: ConversationState) -> dict:
-    """Agent 2's turn to speak."""
+def agent_1_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Agent 1's turn to speak."""
+    response, record = _call_agent(get_model(AGENT_1), _agent_1_prompt(state), "agent_1", config)
+    return _agent_1_update(state, response, record)
+
+
+async def aagent_1_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Agent 1's turn to speak (async)."""
+    async with provider_slot(agent1_provider):
+        response, record = await _acall_agent(get_model(AGENT_1), _agent_1_prompt(state), "agent_1", config)
+    return _agent_1_update(state, response, record)
+
+
+def _agent_2_prompt(state: ConversationState) -> list:
+    """Build Agent 2's prompt, with Agent 1's messages as user input."""
     # Get turn count with default value
     turn_count = state.get('turn_count', 0)
     max_turns = state.get('max_turns', 8)
@@ -131,50 +397,64 @@ Important guidelines:
 - Provide only YOUR response, not the entire conversation
 - Respond to Agent 1's points and offer your own insights
 - Keep your response concise (2-4 sentences)
-- MAXIMUM 100 WORDS - keep your response brief and focused
-
-This is turn {turn_count} of {max_turns}."""
+- MAXIMUM 100 WORDS - keep your response brief and focused"""
 
-    # Prepare messages - swap roles so Agent 1's messages appear as user input
+    # Agent 2's view already has Agent 1's messages as user input
+    summary, history = _windowed_view(state, "agent_2_view")
     messages = [SystemMessage(content=system_prompt)]
+    messages.extend(_view_prompt([], summary, history))
+    return _with_turn_note(messages, turn_count, max_turns)
 
-    for msg in state["messages"]:
-        cleaned_content = re.sub(r'^\[Agent \d\]:\s*', '', msg.content).strip()
 
-        # Determine which agent sent this message by checking the label
-        if "[Agent 1]" in msg.content:
-            # Agent 1's messages become user input for Agent 2
-            messages.append(HumanMessage(content=cleaned_content))
-        elif "[Agent 2]" in msg.content:
-            # Agent 2's previous messages
-            messages.append(AIMessage(content=cleaned_content))
-
-    # Get response and clean
-    response = model_agent2.invoke(messages)
+def _agent_2_update(state: ConversationState, response, record: dict) -> dict:
+    """Turn Agent 2's model response into a state update."""
+    turn_count = state.get('turn_count', 0)
     content = clean_response_content(response)
 
     if not content:
         content = "That's an interesting point. Let me share my perspective on this."
 
     return {
-        "messages": [AIMessage(content=f"[Agent 2]: {content}")],
+        "messages": [AIMessage(content=content, name=AGENT_2)],
+        "agent_1_view": [HumanMessage(content=content)],
+        "agent_2_view": [AIMessage(content=content)],
         "current_speaker": "agent_1",
-        "turn_count": turn_count + 1
+        "turn_count": turn_count + 1,
+        "metrics": [{**record, "turn": turn_count + 1}]
     }
 
 
-def summarizer_node(state: ConversationState) -> dict:
-    """Summarizer agent that provides periodic summaries of the conversation."""
-    # Get recent messages (last summary_interval turns)
+def agent_2_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Agent 2's turn to speak."""
+    response, record = _call_agent(get_model(AGENT_2), _agent_2_prompt(state), "agent_2", config)
+    return _agent_2_update(state, response, record)
+
+
+async def aagent_2_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Agent 2's turn to speak (async)."""
+    async with provider_slot("perplexity"):
+        response, record = await _acall_agent(get_model(AGENT_2), _agent_2_prompt(state), "agent_2", config)
+    return _agent_2_update(state, response, record)
+
+
+def _summarizer_prompt(state: ConversationState) -> list:
+    """Build the periodic summary prompt from the most recent turns.
+
+    With a context_window the summary is what agents see in place of dropped
+    turns, so it is cumulative: the previous summary is folded in with the
+    new turns rather than summarizing only the latest interval.
+    """
+    # Last summary_interval agent turns; with background summaries the previous
+    # summary can sit among them, after the turn that ran alongside it
     interval = state.get("summary_interval", 4)
-    recent_messages = state["messages"][-interval:] if len(state["messages"]) >= interval else state["messages"]
+    recent_messages = [msg for msg in state["messages"] if speaker_of(msg) != SUMMARIZER][-interval:]
 
     # Build conversation context
-    conversation_text = ""
-    for msg in recent_messages:
-        conversation_text += msg.content + "\n\n"
+    conversation_text = "".join(labelled_text(msg) + "\n\n" for msg in recent_messages)
+    previous_summary = _latest_summary(state["messages"]) if state.get("context_window", 0) else None
 
-    system_prompt = f"""You are a neutral summarizer reviewing a discussion about: {state['topic']}
+    if previous_summary is None:
+        system_prompt = f"""You are a neutral summarizer reviewing a discussion about: {state['topic']}
 
 Your role is to provide a brief, objective summary of the last few turns of conversation.
 
@@ -185,31 +465,134 @@ Guidelines:
 - Be objective and balanced
 - Use third person perspective"""
 
-    user_prompt = f"""Summarize the following conversation segment:
+        user_prompt = f"""Summarize the following conversation segment:
 
 {conversation_text}
 
 Provide a brief summary of what has been discussed."""
+    else:
+        system_prompt = f"""You are a neutral summarizer reviewing a discussion about: {state['topic']}
+
+Your role is to keep a running summary of the whole discussion up to date.
+
+Guidelines:
+- Combine the previous summary with the main points of the latest turns
+- Keep earlier points that still matter; drop details that were superseded
+- Highlight any agreements, disagreements, or new insights
+- Keep it concise (6 sentences maximum)
+- Be objective and balanced
+- Use third person perspective"""
+
+        user_prompt = f"""Summary of the discussion so far:
+
+{previous_summary}
+
+Latest turns:
+
+{conversation_text}
+
+Provide an updated summary of the whole discussion."""
 
-    messages = [
+    return [
         SystemMessage(content=system_prompt),
         HumanMessage(content=user_prompt)
     ]
 
-    # Get response
-    response = model_summarizer.invoke(messages)
-    content = clean_response_content(response)
+
+def _compact_history(state: ConversationState) -> dict:
+    """Archive messages no prompt will see again; return RemoveMessage updates per channel.
+
+    Runs when a new summary is written: agents then only need that summary
+    and their last context_window turns. One extra turn is kept so
+    _windowed_view still sees dropped history and swaps in the summary,
+    which keeps prompts identical to an uncompacted run. Metrics records so
+    far are archived too, so no channel grows with the conversation.
+    """
+    context_window = state.get("context_window", 0)
+    archive_path = state.get("archive_path")
+    if not context_window or not archive_path:
+        return {}
+
+    messages = state["messages"]
+    kept = 0
+    index = len(messages)
+    while index > 0 and kept <= context_window:
+        index -= 1
+        if speaker_of(messages[index]) != SUMMARIZER:
+            kept += 1
+
+    updates = {}
+    compacted = messages[:index]
+    if compacted:
+        append_messages(archive_path, compacted)
+        updates["messages"] = [RemoveMessage(id=msg.id) for msg in compacted]
+
+    metrics = state.get("metrics", [])
+    if metrics:
+        append_metrics(archive_path, metrics)
+        updates["metrics"] = [{ARCHIVED_METRICS: len(metrics)}]
+
+    # Views only hold cleaned copies of archived turns, so old entries are just dropped
+    for view_key in ("agent_1_view", "agent_2_view"):
+        dropped = state.get(view_key, [])[:-(context_window + 1)]
+        if dropped:
+            updates[view_key] = [RemoveMessage(id=msg.id) for msg in dropped]
+    return updates
+
+
+def _summarizer_update(state: ConversationState, response, record: dict) -> dict:
+    """Turn the summarizer's model response into a state update."""
+    content = clean_response_content(response, truncate_at_labels=False)
 
     if not content:
         content = "Summary: The agents have been discussing various aspects of the topic."
 
+    compaction = _compact_history(state)
     return {
-        "messages": [AIMessage(content=f"[Summarizer]: {content}")],
+        **compaction,
+        # The turn it covers up to is recorded, since a background summary lands after the next turn
+        "messages": compaction.get("messages", []) + [
+            AIMessage(content=content, name=SUMMARIZER, response_metadata={"turn": state.get("turn_count", 0)})
+        ],
         "current_speaker": "agent_1",  # Resume with agent_1 after summary
-        "turn_count": state.get("turn_count", 0)  
+        "turn_count": state.get("turn_count", 0),
+        "metrics": compaction.get("metrics", []) + [{**record, "turn": state.get("turn_count", 0)}]
     }
 
 
+def summarizer_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Summarizer agent that provides periodic summaries of the conversation."""
+    response, record = _call_summarizer(_summarizer_prompt(state), config)
+    return _summarizer_update(state, response, record)
+
+
+async def asummarizer_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Summarizer agent that provides periodic summaries of the conversation (async)."""
+    async with provider_slot("openai"):
+        response, record = await _acall_summarizer(_summarizer_prompt(state), config)
+    return _summarizer_update(state, response, record)
+
+
+def _background_summarizer_update(state: ConversationState, response, record: dict) -> dict:
+    """Summary update that only writes reducer channels, so it can merge beside an agent turn."""
+    update = _summarizer_update(state, response, record)
+    del update["current_speaker"], update["turn_count"]
+    return update
+
+
+def background_summarizer_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Periodic summary run in parallel with the next agent turn."""
+    response, record = _call_summarizer(_summarizer_prompt(state), config)
+    return _background_summarizer_update(state, response, record)
+
+
+async def abackground_summarizer_node(state: ConversationState, config: RunnableConfig = None) -> dict:
+    """Periodic summary run in parallel with the next agent turn (async)."""
+    async with provider_slot("openai"):
+        response, record = await _acall_summarizer(_summarizer_prompt(state), config)
+    return _background_summarizer_update(state, response, record)
+
+
 def should_continue(state: ConversationState) -> Literal["continue", "end"]:
     """Determine if the conversation should continue."""
     turn_count = state.get("turn_count", 0)
@@ -217,8 +600,12 @@ def should_continue(state: ConversationState) -> Literal["continue", "end"]:
     return "end" if turn_count >= max_turns else "continue"
 
 
-def route_after_agent(state: ConversationState) -> Literal["summarize", "continue", "end"]:
-    """Route to summarizer every N turns, or continue/end conversation."""
+def route_after_agent(state: ConversationState) -> Literal["summarize", "continue", "end"] | list:
+    """Route to summarizer every N turns, or continue/end conversation.
+
+    With background_summary, the summary branch runs in the same step as the
+    next agent turn, so the summary call is off the conversation's critical path.
+    """
     turn_count = state.get("turn_count", 0)
     max_turns = state.get("max_turns", 8)
 
@@ -229,18 +616,33 @@ def route_after_agent(state: ConversationState) -> Literal["summarize", "continu
     # Check if it's time to summarize
     interval = state.get("summary_interval", 4)
     if turn_count > 0 and turn_count % interval == 0:
+        if state.get("background_summary", False):
+            return ["background_summarize", "continue"]
         return "summarize"
 
     return "continue"
 
 
+def recursion_limit_for(max_turns: int, summary_interval: int) -> int:
+    """Graph steps a conversation needs: one per turn and one per periodic summary, plus headroom.
+
+    Pass it as config["recursion_limit"] so the run is not cut short by
+    LangGraph's default limit (only 25 steps in older releases).
+    """
+    summaries = max_turns // summary_interval if summary_interval > 0 else 0
+    return max_turns + summaries + 10
+
+
 # Build the graph
 graph_builder = StateGraph(ConversationState)
 
-# Add nodes
-graph_builder.add_node("agent_1", agent_1_node)
-graph_builder.add_node("agent_2", agent_2_node)
-graph_builder.add_node("summarizer", summarizer_node)
+# Add nodes - app.invoke runs the sync implementations, app.ainvoke the async ones
+graph_builder.add_node("agent_1", RunnableLambda(agent_1_node, afunc=aagent_1_node))
+graph_builder.add_node("agent_2", RunnableLambda(agent_2_node, afunc=aagent_2_node))
+graph_builder.add_node("summarizer", RunnableLambda(summarizer_node, afunc=asummarizer_node))
+graph_builder.add_node(
+    "background_summarizer", RunnableLambda(background_summarizer_node, afunc=abackground_summarizer_node)
+)
 
 # Set entry point
 graph_builder.add_edge(START, "agent_1")
@@ -251,6 +653,7 @@ graph_builder.add_conditional_edges(
     route_after_agent,
     {
         "summarize": "summarizer",
+        "background_summarize": "background_summarizer",
         "continue": "agent_2",
         "end": END
     }
@@ -261,6 +664,7 @@ graph_builder.add_conditional_edges(
     route_after_agent,
     {
         "summarize": "summarizer",
+        "background_summarize": "background_summarizer",
         "continue": "agent_1",
         "end": END
     }
@@ -273,6 +677,14 @@ graph_builder.add_conditional_edges(
     {"continue": "agent_1", "end": END}
 )
 
+# The background branch merges its summary into state and stops there
+graph_builder.add_edge("background_summarizer", END)
+
+def build_app(checkpointer=None):
+    """Compile the conversation graph, optionally with a checkpointer for resumable runs."""
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
 # Compile and export
-graph = graph_builder.compile()
+graph = build_app()
 app = graph
@@ -0,0 +1,147 @@
+"""
+Benchmark graph throughput and per-turn prompt growth on the fake backend.
+
+Runs the compiled app offline for several max_turns / summary_interval /
+context_window combinations and prints one JSON object per run:
+
+    python benchmarks/bench_graph.py --output bench_graph.json
+
+Each record has wall time per turn, framework overhead (wall time minus
+time spent inside model calls), the messages/bytes sent per model call and
+the messages left in live state (runs with a context window compact older
+ones into a temporary archive).
+Runs with a context window must keep every prompt within --prompt-budget;
+the script exits with status 1 if any of them does not.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Select the offline backend before agent.py builds its models
+os.environ["LLM_BACKEND"] = "fake"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from agent import app, recursion_limit_for
+
+MAX_TURNS = (8, 64, 512)
+SUMMARY_INTERVALS = (4, 16)
+CONTEXT_WINDOWS = (0, 8)
+
+
+class ModelCallRecorder(BaseCallbackHandler):
+    """Record prompt size and time spent inside every chat model call."""
+
+    def __init__(self):
+        self.calls = []
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt = messages[0]
+        self._started[run_id] = time.perf_counter()
+        self.calls.append({
+            "run_id": run_id,
+            "messages": len(prompt),
+            "bytes": sum(len(str(message.content).encode("utf-8")) for message in prompt),
+            "seconds": 0.0
+        })
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        elapsed = time.perf_counter() - self._started.pop(run_id)
+        for call in reversed(self.calls):
+            if call["run_id"] == run_id:
+                call["seconds"] = elapsed
+                break
+
+
+def run_case(max_turns, summary_interval, context_window, archive_dir):
+    recorder = ModelCallRecorder()
+    archive_path = os.path.join(archive_dir, f"{max_turns}_{summary_interval}_{context_window}.jsonl")
+
+    start = time.perf_counter()
+    result = app.invoke(
+        {
+            "messages": [],
+            "topic": "How AI can help address educational inequalities?",
+            "current_speaker": "agent_1",
+            "turn_count": 0,
+            "max_turns": max_turns,
+            "summary_interval": summary_interval,
+            "context_window": context_window,
+            "archive_path": archive_path
+        },
+        {"callbacks": [recorder], "recursion_limit": recursion_limit_for(max_turns, summary_interval)}
+    )
+    wall = time.perf_counter() - start
+
+    calls = recorder.calls
+    model_seconds = sum(call["seconds"] for call in calls)
+    return {
+        "max_turns": max_turns,
+        "summary_interval": summary_interval,
+        "context_window": context_window,
+        "turns": result["turn_count"],
+        "model_calls": len(calls),
+        "wall_seconds": wall,
+        "wall_ms_per_turn": wall / max_turns * 1000,
+        "overhead_ms_per_turn": (wall - model_seconds) / max_turns * 1000,
+        "avg_messages_per_call": sum(call["messages"] for call in calls) / len(calls),
+        "max_messages_per_call": max(call["messages"] for call in calls),
+        "avg_bytes_per_call": sum(call["bytes"] for call in calls) / len(calls),
+        "max_bytes_per_call": max(call["bytes"] for call in calls),
+        "total_bytes_sent": sum(call["bytes"] for call in calls),
+        "live_messages": len(result["messages"])
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the conversation graph on the fake backend.")
+    parser.add_argument("--max-turns", type=int, nargs="+", default=list(MAX_TURNS))
+    parser.add_argument("--summary-intervals", type=int, nargs="+", default=list(SUMMARY_INTERVALS))
+    parser.add_argument("--context-windows", type=int, nargs="+", default=list(CONTEXT_WINDOWS))
+    parser.add_argument("--prompt-budget", type=int, default=16000, help="Max bytes per call for runs with a context window")
+    parser.add_argument("--output", help="Also write the results as a JSON array to this file")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    records = []
+    over_budget = []
+    with tempfile.TemporaryDirectory() as archive_dir:
+        for max_turns in args.max_turns:
+            for summary_interval in args.summary_intervals:
+                for context_window in args.context_windows:
+                    record = run_case(max_turns, summary_interval, context_window, archive_dir)
+                    record["commit"] = commit
+                    record["within_budget"] = (
+                        record["max_bytes_per_call"] <= args.prompt_budget if context_window else None
+                    )
+                    if record["within_budget"] is False:
+                        over_budget.append(record)
+                    records.append(record)
+                    print(json.dumps(record), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
+
+    if over_budget:
+        print(f"{len(over_budget)} run(s) exceeded the prompt budget of {args.prompt_budget} bytes", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
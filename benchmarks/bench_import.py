@@ -0,0 +1,92 @@
+"""
+Benchmark cold import time of the graph and the runner script.
+
+Imports each module in a fresh interpreter several times and prints one JSON
+object per module with the median and worst wall time:
+
+    python benchmarks/bench_import.py --budget-ms 1500
+
+The script exits with status 1 if a median is over --budget-ms, or if
+importing pulled in a provider SDK (models must be built on first use, not
+at import).
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("agent", "run_agent")
+PROVIDER_PACKAGES = ("openai", "anthropic", "langchain_openai", "langchain_anthropic")
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "providers": [name for name in {providers!r} if name in sys.modules]}}))
+"""
+
+
+def time_import(module):
+    """Import module in a fresh interpreter, returning (seconds, provider packages loaded)."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, providers=PROVIDER_PACKAGES)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["providers"]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the conversation graph.")
+    parser.add_argument("--modules", nargs="+", default=list(MODULES))
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Max median import time per module")
+    parser.add_argument("--output", help="Also write the results as a JSON array to this file")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    records = []
+    failures = []
+    for module in args.modules:
+        runs = [time_import(module) for _ in range(args.repeat)]
+        seconds = [elapsed for elapsed, _ in runs]
+        providers = sorted({name for _, loaded in runs for name in loaded})
+        record = {
+            "module": module,
+            "median_ms": statistics.median(seconds) * 1000,
+            "max_ms": max(seconds) * 1000,
+            "providers_imported": providers,
+            "budget_ms": args.budget_ms,
+            "commit": commit
+        }
+        record["within_budget"] = record["median_ms"] <= args.budget_ms and not providers
+        if not record["within_budget"]:
+            failures.append(record)
+        records.append(record)
+        print(json.dumps(record), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
+
+    if failures:
+        print(f"{len(failures)} module(s) exceeded the {args.budget_ms:.0f} ms startup budget or imported a provider SDK", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
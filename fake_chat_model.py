@@ -0,0 +1,134 @@
+"""
+Deterministic fake chat model for offline runs and benchmarking.
+Responses and latencies are derived from a hash of the prompt, so the same
+conversation always plays out the same way without any network access.
+"""
+
+import math
+import time
+import random
+import asyncio
+import hashlib
+from typing import Literal, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+VOCABULARY = (
+    "students teachers schools learning access equity resources tutoring data "
+    "feedback curriculum support rural urban funding devices bandwidth language "
+    "assessment personalized adaptive inclusion policy training outcomes gaps "
+    "community families privacy bias evidence pilot scale cost research"
+).split()
+
+
+class DeterministicFakeChatModel(BaseChatModel):
+    """Offline chat model with deterministic output and configurable latency."""
+
+    model_name: str = "fake"
+    base_url: Optional[str] = None  # The API this model stands in for (keys its rate limiter)
+    response_words: int = 40
+    latency: Literal["fixed", "lognormal", "heavy_tail"] = "fixed"
+    latency_ms: float = 0.0  # Mean latency per call
+    latency_sigma: float = 0.5  # Spread of the lognormal distribution
+    tail_alpha: float = 1.5  # Pareto shape for heavy_tail (smaller = heavier tail)
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "deterministic-fake"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {
+            "model_name": self.model_name,
+            "response_words": self.response_words,
+            "seed": self.seed
+        }
+
+    def _prompt_digest(self, messages: list) -> str:
+        """Hash the model name and prompt so output is reproducible."""
+        digest = hashlib.sha256(f"{self.seed}:{self.model_name}".encode("utf-8"))
+        for message in messages:
+            digest.update(f"{message.type}:{message.content}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        """Latency in seconds, with mean latency_ms for every distribution."""
+        if self.latency_ms <= 0:
+            return 0.0
+        mean = self.latency_ms / 1000
+        if self.latency == "lognormal":
+            sigma = self.latency_sigma
+            return rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        if self.latency == "heavy_tail":
+            alpha = self.tail_alpha
+            return mean * (alpha - 1) / alpha * rng.paretovariate(alpha)
+        return mean
+
+    def _respond(self, messages: list, stop=None):
+        """Return (response text, latency seconds, usage metadata) for a prompt."""
+        digest = self._prompt_digest(messages)
+        # Separate generators keep the text identical whatever the latency settings
+        latency = self._sample_latency(random.Random(f"{digest}:latency"))
+        rng = random.Random(digest)
+        words = [rng.choice(VOCABULARY) for _ in range(self.response_words)]
+        text = " ".join(words).capitalize() + "."
+
+        for stop_sequence in stop or []:
+            if stop_sequence in text:
+                text = text[:text.index(stop_sequence)]
+
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(text.split())
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+        return text, latency, usage
+
+    def _result(self, text: str, usage: dict) -> ChatResult:
+        message = AIMessage(
+            content=text,
+            usage_metadata=usage,
+            response_metadata={"model_name": self.model_name}
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, latency, usage = self._respond(messages, stop)
+        time.sleep(latency)
+        return self._result(text, usage)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, latency, usage = self._respond(messages, stop)
+        await asyncio.sleep(latency)
+        return self._result(text, usage)
+
+    def _chunks(self, text: str, usage: dict):
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=usage if last else None,
+                response_metadata={"model_name": self.model_name} if last else {}
+            ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # The whole sampled latency is spent before the first token
+        text, latency, usage = self._respond(messages, stop)
+        time.sleep(latency)
+        for chunk in self._chunks(text, usage):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, latency, usage = self._respond(messages, stop)
+        await asyncio.sleep(latency)
+        for chunk in self._chunks(text, usage):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,175 @@
+"""
+Hedged model calls for agent turns and periodic summaries.
+With HEDGE_PERCENTILE set (e.g. 95), a call that has produced neither a
+response nor a first streamed token by that percentile of the node's recent
+latencies gets a duplicate request - to HEDGE_FALLBACK_MODEL if one is
+configured. Whichever first streams a token or finishes is kept and the
+other is cancelled. Latencies are measured the same way: time to first
+token for calls that stream (including under LangGraph's "messages" stream
+mode), time to the whole response otherwise.
+Hedging starts once a node has HEDGE_MIN_SAMPLES observed calls, or
+immediately with a fixed HEDGE_DEADLINE_MS. A hedged call's record keeps
+the winning request's own timings and adds hedge_race_ms, the time from
+the original request to the winning response.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from langgraph.constants import TAG_NOSTREAM
+from http_clients import run_coroutine
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0"))  # 0 = hedging off
+HEDGE_DEADLINE_MS = float(os.getenv("HEDGE_DEADLINE_MS", "0"))  # Fixed deadline instead of the percentile
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = 200  # Recent latencies kept per node
+
+# The duplicate is kept out of LangGraph's token stream, so its partial output is
+# never shown next to the original's; if it wins, its final message still is
+DUPLICATE_CONFIG = {"tags": [TAG_NOSTREAM]}
+
+_latencies = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def hedging_enabled() -> bool:
+    return HEDGE_PERCENTILE > 0 or HEDGE_DEADLINE_MS > 0
+
+
+def _observe(node: str, seconds: float) -> None:
+    with _lock:
+        _latencies.setdefault(node, deque(maxlen=HEDGE_WINDOW)).append(seconds)
+
+
+def _latency(record: dict) -> float:
+    # Streamed calls are judged by their first token, others by the whole response
+    ms = record["ttft_ms"] if record.get("ttft_ms") is not None else record["wall_ms"]
+    return ms / 1000
+
+
+def deadline_for(node: str):
+    """Seconds to wait before hedging a call from node, or None if it should not be hedged."""
+    if HEDGE_DEADLINE_MS > 0:
+        return HEDGE_DEADLINE_MS / 1000
+    if HEDGE_PERCENTILE <= 0:
+        return None
+    with _lock:
+        samples = sorted(_latencies.get(node, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))]
+
+
+def _estimated_saving(node: str, elapsed: float) -> float:
+    """Expected extra wait had the slow primary been kept, from latencies above elapsed."""
+    with _lock:
+        slower = [seconds for seconds in _latencies.get(node, ()) if seconds > elapsed]
+    return sum(slower) / len(slower) - elapsed if slower else 0.0
+
+
+def _count(node: str, hedged: bool = False, backup_won: bool = False, saved: float = 0.0) -> None:
+    with _lock:
+        stats = _stats.setdefault(node, {"calls": 0, "hedged": 0, "backup_wins": 0, "saved_seconds": 0.0})
+        stats["calls"] += 1
+        stats["hedged"] += hedged
+        stats["backup_wins"] += backup_won
+        stats["saved_seconds"] += saved
+
+
+def hedge_stats() -> dict:
+    """Per node: calls, hedged calls, hedges won by the duplicate and estimated seconds saved."""
+    with _lock:
+        return {node: dict(stats) for node, stats in _stats.items()}
+
+
+def hedged_call(node: str, call, acall, model, backup_model=None):
+    """Run call(model) -> (response, record), hedging it once node has a deadline.
+
+    Once node has a deadline, the call runs on the shared background event
+    loop through acall(model, on_first_token, config), so the losing request
+    can be cancelled; config is extra run config to merge into the call's.
+    """
+    deadline = deadline_for(node)
+    if deadline is None:
+        response, record = call(model)
+        _observe(node, _latency(record))
+        _count(node)
+        return response, record
+    return run_coroutine(_race(node, acall, model, backup_model or model, deadline))
+
+
+async def ahedged_call(node: str, acall, model, backup_model=None):
+    """Async version of hedged_call; acall(model, on_first_token, config) -> (response, record)."""
+    deadline = deadline_for(node)
+    if deadline is None:
+        response, record = await acall(model, None, None)
+        _observe(node, _latency(record))
+        _count(node)
+        return response, record
+    return await _race(node, acall, model, backup_model or model, deadline)
+
+
+async def _first_sign(task: asyncio.Future, first_token: asyncio.Event) -> None:
+    """Wait until task finishes or streams its first token."""
+    started = asyncio.ensure_future(first_token.wait())
+    try:
+        await asyncio.wait({task, started}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        started.cancel()
+
+
+async def _race(node: str, acall, model, backup_model, deadline: float):
+    start = time.perf_counter()
+    first_token = asyncio.Event()
+    primary = asyncio.ensure_future(acall(model, first_token.set, None))
+    tasks = [primary]
+    # Waiter per request -> request; a waiter completes when its request streams or finishes
+    signs = {asyncio.ensure_future(_first_sign(primary, first_token)): primary}
+    try:
+        await asyncio.wait(set(signs), timeout=deadline)
+        if primary.done() or first_token.is_set():
+            response, record = await primary
+            _observe(node, _latency(record))
+            _count(node)
+            return response, record
+
+        backup_token = asyncio.Event()
+        backup = asyncio.ensure_future(acall(backup_model, backup_token.set, DUPLICATE_CONFIG))
+        tasks.append(backup)
+        signs[asyncio.ensure_future(_first_sign(backup, backup_token))] = backup
+        winner = None
+        pending = set(signs)
+        while winner is None and pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ready = {signs[sign] for sign in done}
+            # The first request to stream a token or succeed wins; one that failed drops out
+            winner = next((task for task in tasks if task in ready and not (task.done() and task.exception())), None)
+        if winner is None:
+            # Both requests failed: surface the original's error
+            raise primary.exception()
+        first_sign = time.perf_counter() - start
+        for task in tasks:
+            if task is not winner:
+                task.cancel()
+        response, record = await winner
+    finally:
+        # Cancel whatever is still running (everything, if this call was cancelled)
+        for task in tasks + list(signs):
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    backup_won = winner is not primary
+    if backup_won:
+        # The cancelled original had produced nothing by then; record that so the tail stays visible
+        _observe(node, first_sign)
+        saved = _estimated_saving(node, first_sign)
+    else:
+        _observe(node, _latency(record))
+        saved = 0.0
+    _count(node, hedged=True, backup_won=backup_won, saved=saved)
+    return response, {
+        **record, "hedged": True, "hedge_won": backup_won, "hedge_race_ms": elapsed * 1000, "hedge_saved_ms": saved * 1000
+    }
@@ -0,0 +1,70 @@
+"""
+Process-wide pooled HTTP clients shared by every chat model client.
+All models built for the same base_url share one keep-alive sync client and
+one async client, so batch runs reuse open TLS connections instead of
+handshaking per client. Pool sizes come from HTTP_MAX_CONNECTIONS,
+HTTP_MAX_KEEPALIVE_CONNECTIONS and HTTP_KEEPALIVE_EXPIRY.
+"""
+
+import os
+import asyncio
+import threading
+
+# (kind, base_url) -> httpx client
+_clients = {}
+_clients_lock = threading.Lock()
+_background_loop = None
+
+
+def pool_limits():
+    """Connection pool limits for the shared clients, from the environment."""
+    import httpx
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "50")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    )
+
+
+def _shared_client(kind: str, base_url):
+    key = (kind, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import httpx
+                # Same timeouts as the provider SDKs' defaults; they also set them per request
+                options = {"limits": pool_limits(), "timeout": httpx.Timeout(600.0, connect=5.0)}
+                client = httpx.Client(**options) if kind == "sync" else httpx.AsyncClient(**options)
+                _clients[key] = client
+    return client
+
+
+def get_http_client(base_url=None):
+    """Return the shared keep-alive httpx.Client for base_url."""
+    return _shared_client("sync", base_url)
+
+
+def get_async_http_client(base_url=None):
+    """Return the shared keep-alive httpx.AsyncClient for base_url.
+
+    Pooled async connections belong to the event loop that opened them, so
+    sync code should run its coroutines through run_coroutine() rather than
+    a fresh asyncio.run() each time.
+    """
+    return _shared_client("async", base_url)
+
+
+def run_coroutine(coro):
+    """Run a coroutine to completion on one long-lived background event loop.
+
+    Keeps the shared async clients on a single loop across sync calls, and
+    works whether or not the caller is already inside an event loop.
+    """
+    global _background_loop
+    with _clients_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="http-clients-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
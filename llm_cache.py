@@ -0,0 +1,119 @@
+"""
+Persistent SQLite cache for LLM responses with LRU eviction.
+Plugs into LangChain's global cache hook, so every chat model call in
+agent.py and summarizer.py is served from disk when the same model,
+parameters and messages have been seen before. Messages served from the
+cache are flagged (is_cache_hit), so the rate limiter does not count them
+against an API's quota.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+CACHE_HIT = "cache_hit"  # response_metadata flag on messages loaded from the cache
+
+
+class SQLiteLRUCache(BaseCache):
+    """LLM response cache stored in SQLite, evicting least recently used entries."""
+
+    def __init__(self, path: str = ".llm_cache.sqlite", max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                llm_string TEXT NOT NULL,
+                generations TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        # llm_string carries the model name and parameters, prompt the serialized messages
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generations FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        return [self._load_generation(item) for item in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        key = self._key(prompt, llm_string)
+        generations = json.dumps([self._dump_generation(gen) for gen in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, generations, last_used) VALUES (?, ?, ?, ?)",
+                (key, llm_string, generations, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries beyond max_entries."""
+        excess = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+
+    def _dump_generation(self, generation) -> dict:
+        if isinstance(generation, ChatGeneration):
+            return {"message": message_to_dict(generation.message)}
+        return {"text": generation.text}
+
+    def _load_generation(self, item: dict):
+        if "message" in item:
+            message = messages_from_dict([item["message"]])[0]
+            message.response_metadata = {**message.response_metadata, CACHE_HIT: True}
+            return ChatGeneration(message=message)
+        return Generation(text=item["text"])
+
+
+def is_cache_hit(response) -> bool:
+    """Whether a model response was served from the SQLite cache rather than the API."""
+    if isinstance(response, dict):
+        # Structured output with include_raw=True keeps the model message under "raw"
+        response = response.get("raw")
+    return bool((getattr(response, "response_metadata", None) or {}).get(CACHE_HIT))
+
+
+def enable_llm_cache(path: str = ".llm_cache.sqlite", max_entries: int = 10000) -> SQLiteLRUCache:
+    """Install a SQLite LRU cache as LangChain's process-wide LLM cache."""
+    cache = SQLiteLRUCache(path, max_entries=max_entries)
+    set_llm_cache(cache)
+    return cache
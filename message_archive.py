@@ -0,0 +1,83 @@
+"""
+JSONL archive for messages compacted out of the live conversation state.
+With a context window, agents only ever see the latest summary and the last
+few turns, so older messages are appended here and removed from the graph
+state; full_history() puts the complete transcript back together. Metrics
+records compacted with them go to a sidecar file (metrics_path), which
+full_metrics() merges back for the performance table.
+"""
+
+import os
+import json
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+ARCHIVE_DIR = "conversation_archives"
+
+
+def append_messages(path: str, messages: list) -> None:
+    """Append messages to the archive file, one JSON object per line."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for message in messages:
+            f.write(json.dumps(message_to_dict(message)) + "\n")
+
+
+def load_messages(path: str) -> list:
+    """Load archived messages in order, or [] if nothing has been archived yet."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return messages_from_dict([json.loads(line) for line in f if line.strip()])
+
+
+def full_history(state: dict) -> list:
+    """Archived messages followed by the live ones, for transcripts and final summaries.
+
+    A node re-run after resuming from a checkpoint may archive the same
+    messages twice, so messages are de-duplicated by id.
+    """
+    history = []
+    seen = set()
+    for message in load_messages(state.get("archive_path")) + list(state["messages"]):
+        if message.id is None or message.id not in seen:
+            seen.add(message.id)
+            history.append(message)
+    return history
+
+
+def metrics_path(archive_path: str) -> str:
+    """Sidecar file for metrics records archived alongside the messages in archive_path."""
+    return f"{os.path.splitext(archive_path)[0]}.metrics.jsonl"
+
+
+def append_metrics(archive_path: str, records: list) -> None:
+    """Append metrics records to the archive's sidecar file."""
+    path = metrics_path(archive_path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def full_metrics(state: dict) -> list:
+    """Archived metrics records followed by the live ones, in call order.
+
+    Like messages, records re-archived by a node re-run after a resume are
+    dropped; records carry no id, so identical lines count as duplicates.
+    """
+    lines = []
+    path = metrics_path(state["archive_path"]) if state.get("archive_path") else ""
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+    records = []
+    seen = set()
+    for line in lines:
+        if line not in seen:
+            seen.add(line)
+            records.append(json.loads(line))
+    return records + list(state.get("metrics", []))
@@ -0,0 +1,215 @@
+"""
+Timed chat model calls that record latency and token usage.
+Every graph node and the final summarizer go through these helpers, so
+each call yields one metrics record alongside the model's response.
+Calls also pass through the rate limiter for their API (see rate_limiter),
+which may delay or retry them; records note the time spent throttled.
+Responses served from the LLM cache give their quota back.
+"""
+
+import time
+from functools import partial
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables.config import merge_configs
+from rate_limiter import limiter_for, estimate_tokens, retry_delay
+from llm_cache import is_cache_hit
+
+
+class FirstTokenTimer(BaseCallbackHandler):
+    """Note when the first streamed token of a model call arrives, and call on_first_token()."""
+
+    # Called on the event loop rather than in an executor, so on_first_token may touch loop objects
+    run_inline = True
+
+    def __init__(self, on_first_token=None):
+        self.first_token = None
+        self.on_first_token = on_first_token
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            if self.on_first_token is not None:
+                self.on_first_token()
+
+
+def _call_record(node: str, model, start: float, timer: FirstTokenTimer, response) -> dict:
+    """Build the metrics record for one completed model call."""
+    end = time.perf_counter()
+    if isinstance(response, dict):
+        # Structured output with include_raw=True keeps the model message under "raw"
+        response = response.get("raw")
+    usage = getattr(response, "usage_metadata", None) or {}
+    return {
+        "node": node,
+        "model": getattr(response, "response_metadata", {}).get("model_name") or getattr(model, "model_name", None),
+        "wall_ms": (end - start) * 1000,
+        # Only streamed calls report a first token
+        "ttft_ms": (timer.first_token - start) * 1000 if timer.first_token is not None else None,
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        # Input tokens served from the provider's prompt cache
+        "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read") or 0
+    }
+
+
+def _rate_limited(model, messages, call):
+    """Run call() within the model's rate limits, retrying rate-limit errors."""
+    limiter = limiter_for(model)
+    estimated = estimate_tokens(messages)
+    throttled = 0.0
+    attempt = 0
+    while True:
+        throttled += limiter.acquire(estimated)
+        try:
+            response, record = call()
+        except Exception as error:
+            delay = retry_delay(error, attempt)
+            if delay is None:
+                raise
+            limiter.backoff(delay)
+            attempt += 1
+            continue
+        return _throttled_result(limiter, estimated, response, record, throttled, attempt)
+
+
+async def _arate_limited(model, messages, call):
+    """Async version of _rate_limited for a coroutine function call()."""
+    limiter = limiter_for(model)
+    estimated = estimate_tokens(messages)
+    throttled = 0.0
+    attempt = 0
+    while True:
+        throttled += await limiter.aacquire(estimated)
+        try:
+            response, record = await call()
+        except Exception as error:
+            delay = retry_delay(error, attempt)
+            if delay is None:
+                raise
+            limiter.backoff(delay)
+            attempt += 1
+            continue
+        return _throttled_result(limiter, estimated, response, record, throttled, attempt)
+
+
+def _throttled_result(limiter, estimated: int, response, record: dict, throttled: float, retries: int):
+    if is_cache_hit(response):
+        # The cached message still carries its original usage, but no request was sent
+        limiter.refund(estimated)
+    else:
+        limiter.record_usage(estimated, record["input_tokens"] + record["output_tokens"])
+    # Waiting for quota is not part of wall_ms, which only times the successful attempt
+    record["throttled_ms"] = throttled * 1000
+    record["retries"] = retries
+    return response, record
+
+
+def invoke_model(model, messages: list, node: str, config=None, on_first_token=None, **kwargs):
+    """Invoke a chat model, returning (response, metrics record).
+
+    on_first_token() is called if the model streams internally (e.g. under
+    LangGraph's "messages" stream mode) when its first token arrives.
+    """
+    return _rate_limited(model, messages, partial(_invoke, model, messages, node, config, on_first_token, **kwargs))
+
+
+async def ainvoke_model(model, messages: list, node: str, config=None, on_first_token=None, **kwargs):
+    """Invoke a chat model asynchronously, returning (response, metrics record)."""
+    return await _arate_limited(model, messages, partial(_ainvoke, model, messages, node, config, on_first_token, **kwargs))
+
+
+def _invoke(model, messages: list, node: str, config=None, on_first_token=None, **kwargs):
+    timer = FirstTokenTimer(on_first_token)
+    start = time.perf_counter()
+    response = model.invoke(messages, merge_configs(config, {"callbacks": [timer]}), **kwargs)
+    return response, _call_record(node, model, start, timer, response)
+
+
+async def _ainvoke(model, messages: list, node: str, config=None, on_first_token=None, **kwargs):
+    timer = FirstTokenTimer(on_first_token)
+    start = time.perf_counter()
+    response = await model.ainvoke(messages, merge_configs(config, {"callbacks": [timer]}), **kwargs)
+    return response, _call_record(node, model, start, timer, response)
+
+
+def _chunk_text(chunk) -> str:
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if isinstance(block, dict))
+
+
+def stream_model(model, messages: list, node: str, config=None, stop_when=None, on_first_token=None, **kwargs):
+    """Stream a chat model call, returning (response, metrics record).
+
+    The stream is closed - cancelling the request - as soon as
+    stop_when(text so far) is true, so no further tokens are generated or billed.
+    on_first_token() is called when the first chunk arrives. A rate-limit
+    error restarts the stream from scratch.
+    """
+    return _rate_limited(model, messages, partial(_stream, model, messages, node, config, stop_when, on_first_token, **kwargs))
+
+
+async def astream_model(model, messages: list, node: str, config=None, stop_when=None, on_first_token=None, **kwargs):
+    """Stream a chat model call asynchronously, returning (response, metrics record)."""
+    return await _arate_limited(model, messages, partial(_astream, model, messages, node, config, stop_when, on_first_token, **kwargs))
+
+
+def _stream(model, messages: list, node: str, config=None, stop_when=None, on_first_token=None, **kwargs):
+    start = time.perf_counter()
+    first_token = None
+    response = None
+    text = ""
+    stopped_early = False
+
+    stream = model.stream(messages, config, **kwargs)
+    try:
+        for chunk in stream:
+            if first_token is None:
+                first_token = time.perf_counter()
+                if on_first_token is not None:
+                    on_first_token()
+            response = chunk if response is None else response + chunk
+            text += _chunk_text(chunk)
+            if stop_when is not None and stop_when(text):
+                stopped_early = True
+                break
+    finally:
+        stream.close()
+
+    return _stream_result(node, model, start, first_token, response, stopped_early)
+
+
+async def _astream(model, messages: list, node: str, config=None, stop_when=None, on_first_token=None, **kwargs):
+    start = time.perf_counter()
+    first_token = None
+    response = None
+    text = ""
+    stopped_early = False
+
+    stream = model.astream(messages, config, **kwargs)
+    try:
+        async for chunk in stream:
+            if first_token is None:
+                first_token = time.perf_counter()
+                if on_first_token is not None:
+                    on_first_token()
+            response = chunk if response is None else response + chunk
+            text += _chunk_text(chunk)
+            if stop_when is not None and stop_when(text):
+                stopped_early = True
+                break
+    finally:
+        await stream.aclose()
+
+    return _stream_result(node, model, start, first_token, response, stopped_early)
+
+
+def _stream_result(node: str, model, start: float, first_token, response, stopped_early: bool):
+    if response is None:
+        response = AIMessageChunk(content="")
+    timer = FirstTokenTimer()
+    timer.first_token = first_token
+    record = _call_record(node, model, start, timer, response)
+    record["stopped_early"] = stopped_early
+    return response, record
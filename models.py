@@ -0,0 +1,87 @@
+"""
+Chat model construction for the configured backend.
+Set LLM_BACKEND=fake to run the whole graph and summarizer offline with
+DeterministicFakeChatModel instead of the OpenAI/Perplexity APIs.
+
+Models are registered by name and built on first use (get_model), and each
+provider package is only imported when a model for it is created, so
+importing the graph does not pay for clients it never calls.
+"""
+
+import os
+import threading
+
+# name -> zero-argument factory, and the models built from them so far
+_factories = {}
+_models = {}
+_models_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_env() -> None:
+    """Load .env into the environment once per process."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def fake_model_settings() -> dict:
+    """Read fake backend settings from FAKE_LLM_* environment variables."""
+    return {
+        "response_words": int(os.getenv("FAKE_LLM_WORDS", "40")),
+        "latency": os.getenv("FAKE_LLM_LATENCY", "fixed"),
+        "latency_ms": float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+        "latency_sigma": float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+        "tail_alpha": float(os.getenv("FAKE_LLM_TAIL_ALPHA", "1.5")),
+        "seed": int(os.getenv("FAKE_LLM_SEED", "0")),
+        "disable_streaming": os.getenv("FAKE_LLM_STREAMING", "1") != "1"
+    }
+
+
+def create_chat_model(model: str, api_key=None, base_url=None, provider="openai", **kwargs):
+    """Build a chat model for the backend selected by LLM_BACKEND (openai or fake).
+
+    provider picks the client for real backends: "openai" (also used for
+    OpenAI-compatible APIs such as Perplexity) or "anthropic".
+    """
+    load_env()
+    if os.getenv("LLM_BACKEND", "openai") == "fake":
+        from fake_chat_model import DeterministicFakeChatModel
+        return DeterministicFakeChatModel(model_name=model, base_url=base_url, **fake_model_settings())
+
+    # model_calls retries rate-limit errors itself (see rate_limiter), with the waits
+    # counted in its metrics; SDK retries would add unrecorded attempts and backoff
+    kwargs.setdefault("max_retries", 0)
+
+    if provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(model=model, api_key=api_key, **kwargs)
+
+    from langchain_openai import ChatOpenAI
+    from http_clients import get_http_client, get_async_http_client
+    # Models for the same API share pooled keep-alive connections
+    kwargs.setdefault("http_client", get_http_client(base_url))
+    kwargs.setdefault("http_async_client", get_async_http_client(base_url))
+    return ChatOpenAI(model=model, api_key=api_key, base_url=base_url, **kwargs)
+
+
+def register_model(name: str, factory) -> None:
+    """Register a zero-argument factory that builds the named model on first use."""
+    with _models_lock:
+        _factories[name] = factory
+        _models.pop(name, None)
+
+
+def get_model(name: str):
+    """Return the named model, building it the first time it is asked for."""
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                # Factories may read API keys from the environment
+                load_env()
+                model = _models[name] = _factories[name]()
+    return model
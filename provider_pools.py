@@ -0,0 +1,104 @@
+"""
+Per-provider worker pools for async model calls.
+Each provider (openai, perplexity, anthropic) has its own pool of workers,
+and every async graph node holds one of its provider's workers for the
+length of its model call. A batch keeps more conversations in flight than
+any one pool has workers, so while one conversation waits on Perplexity
+another's agent 1 turn uses OpenAI capacity. Pools also track how busy
+they were, for the utilization report at the end of a batch.
+"""
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class ProviderPool:
+    """A provider's worker pool (unbounded when size is None) with usage accounting."""
+
+    def __init__(self, size=None):
+        self.size = size
+        self._semaphore = asyncio.Semaphore(size) if size else None
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.busy_seconds = 0.0  # Worker-seconds spent in calls
+        self.active_seconds = 0.0  # Wall seconds with at least one call in flight
+        self.wait_seconds = 0.0  # Time calls spent queued for a worker
+        self._changed = time.perf_counter()
+
+    def _advance(self, now: float) -> None:
+        elapsed = now - self._changed
+        self.busy_seconds += self.in_flight * elapsed
+        if self.in_flight:
+            self.active_seconds += elapsed
+        self._changed = now
+
+    @asynccontextmanager
+    async def worker(self):
+        """Hold one worker for the duration of the block."""
+        queued = time.perf_counter()
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            now = time.perf_counter()
+            self.wait_seconds += now - queued
+            self._advance(now)
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                yield
+            finally:
+                self._advance(time.perf_counter())
+                self.in_flight -= 1
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def utilization(self, elapsed: float) -> dict:
+        """Usage over the last `elapsed` seconds of wall time."""
+        self._advance(time.perf_counter())
+        elapsed = max(elapsed, 1e-9)
+        return {
+            "workers": self.size,
+            "calls": self.calls,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_in_flight": self.busy_seconds / elapsed,
+            # Share of worker capacity used (None for unbounded pools)
+            "utilization": self.busy_seconds / (self.size * elapsed) if self.size else None,
+            # Share of the time the provider had any call in flight
+            "active": self.active_seconds / elapsed,
+            "avg_wait_ms": self.wait_seconds / self.calls * 1000 if self.calls else 0.0
+        }
+
+
+_pools = {}
+
+
+def set_provider_limits(limits: dict) -> None:
+    """Size each provider's worker pool, e.g. {"openai": 8, "perplexity": 4}, and reset usage stats.
+
+    Providers without a limit get an unbounded pool that is only tracked.
+    """
+    _pools.clear()
+    for provider, limit in limits.items():
+        _pools[provider] = ProviderPool(limit or None)
+
+
+def provider_slot(provider: str):
+    """Async context manager holding one of the provider's workers."""
+    pool = _pools.get(provider)
+    if pool is None:
+        pool = _pools[provider] = ProviderPool()
+    return pool.worker()
+
+
+def pool_capacity() -> int:
+    """Total workers across bounded pools (0 if no pool is bounded)."""
+    return sum(pool.size for pool in _pools.values() if pool.size)
+
+
+def provider_utilization(elapsed: float) -> dict:
+    """Per-provider usage stats over the last `elapsed` seconds."""
+    return {provider: pool.utilization(elapsed) for provider, pool in _pools.items()}
@@ -0,0 +1,205 @@
+"""
+Per-API rate limiting and retry for chat model calls.
+Every model call goes through the limiter for its base URL: token buckets
+for requests/min and tokens/min delay calls that would exceed the quota,
+and rate-limit, overload and connection errors are retried with jittered
+exponential backoff that honours Retry-After. Clients are built with their
+SDK's own retries off, so every attempt and wait is counted here; calls
+answered from the LLM cache get their reservation back. Limits
+come from configure_rate_limits() or the RATE_LIMITS environment variable,
+e.g.
+
+    RATE_LIMITS='{"https://api.openai.com/v1": {"rpm": 500, "tpm": 200000}}'
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+# Connection failures and timeouts (OpenAI/Anthropic SDKs, httpx) carry no status code
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "TransportError"}
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "6"))
+BACKOFF_BASE = 1.0  # Seconds before the first retry (before jitter)
+BACKOFF_MAX = 60.0
+
+_limits = None
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; reservations may run into debt."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        # Allow bursts of about ten seconds' worth of quota
+        self.capacity = max(1.0, per_minute / 6.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount from the bucket, returning the seconds until it is covered."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min limits for one API, with throttling stats."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._resume_at = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request of about `tokens` tokens; return how long to wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._resume_at - now)
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            self.requests += 1
+            self.throttled_seconds += wait
+            return wait
+
+    def acquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def refund(self, tokens: int) -> None:
+        """Return the reservation of a call that never reached the API (served from the LLM cache)."""
+        with self._lock:
+            if self._requests is not None:
+                self._requests.level += 1
+            if self._tokens is not None:
+                self._tokens.level += tokens
+            self.requests -= 1
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """Correct the tokens/min bucket once a call reports its real usage."""
+        if self._tokens is not None and actual:
+            with self._lock:
+                self._tokens.level -= actual - estimated
+
+    def backoff(self, seconds: float) -> None:
+        """Hold every call to this API for `seconds` after a rate-limit error."""
+        with self._lock:
+            self.retries += 1
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "throttled_seconds": self.throttled_seconds}
+
+
+def configure_rate_limits(limits: dict) -> None:
+    """Set {base_url: {"rpm": ..., "tpm": ...}} limits, replacing any existing limiters."""
+    global _limits
+    with _limiters_lock:
+        _limits = {base_url.rstrip("/"): limit for base_url, limit in limits.items() if limit}
+        _limiters.clear()
+
+
+def base_url_of(model) -> str:
+    """Return the API base URL a chat model (or a runnable wrapping one) sends requests to."""
+    for attr in ("openai_api_base", "anthropic_api_url", "base_url"):
+        url = getattr(model, attr, None)
+        if isinstance(url, str) and url:
+            return url.rstrip("/")
+    # Structured-output and bound runnables wrap the chat model
+    for attr in ("bound", "first"):
+        inner = getattr(model, attr, None)
+        if inner is not None:
+            return base_url_of(inner)
+    for inner in (getattr(model, "steps__", None) or {}).values():
+        return base_url_of(inner)
+    return DEFAULT_BASE_URL
+
+
+def limiter_for(model) -> RateLimiter:
+    """Return the shared limiter for the model's API (unlimited unless configured)."""
+    global _limits
+    base_url = base_url_of(model)
+    limiter = _limiters.get(base_url)
+    if limiter is None:
+        with _limiters_lock:
+            if _limits is None:
+                _limits = {url.rstrip("/"): limit for url, limit in json.loads(os.getenv("RATE_LIMITS", "{}")).items()}
+            limiter = _limiters.get(base_url)
+            if limiter is None:
+                limit = _limits.get(base_url) or {}
+                limiter = _limiters[base_url] = RateLimiter(limit.get("rpm"), limit.get("tpm"))
+    return limiter
+
+
+def rate_limit_stats() -> dict:
+    """Requests, retries and seconds spent throttled, per API base URL."""
+    with _limiters_lock:
+        return {base_url: limiter.stats() for base_url, limiter in _limiters.items()}
+
+
+def estimate_tokens(messages) -> int:
+    # Roughly four characters per token; corrected with the reported usage afterwards
+    if isinstance(messages, str):
+        return len(messages) // 4
+    return sum(len(str(getattr(message, "content", message))) for message in messages) // 4
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error):
+    """Seconds from the error's Retry-After (or retry-after-ms) header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def retry_delay(error, attempt: int):
+    """Seconds to wait before retry number attempt + 1, or None if the error is not retryable."""
+    if attempt >= MAX_RETRIES:
+        return None
+    transient = any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+    if not transient and _status_code(error) not in RETRYABLE_STATUS:
+        return None
+    # Full jitter spreads out conversations that were throttled together
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, _retry_after(error) or 0.0)
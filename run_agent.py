@@ -3,84 +3,423 @@ Test script to run a conversation between two agents.
 """
 
 import os
+import csv
+import json
+import hashlib
+import time
+import asyncio
+import argparse
+from uuid import uuid4
 from datetime import datetime
-from agent import app
+from langchain_core.globals import get_llm_cache
+from langchain_core.messages import AIMessageChunk
+from agent import app, build_app, recursion_limit_for, PERPLEXITY_BASE_URL
+from provider_pools import provider_slot, set_provider_limits, pool_capacity, provider_utilization
 from summarizer import ConversationSummarizer
+from models import get_model
+from llm_cache import SQLiteLRUCache, enable_llm_cache
+from rate_limiter import DEFAULT_BASE_URL, configure_rate_limits, rate_limit_stats
+from hedging import hedging_enabled, hedge_stats
+from message_archive import ARCHIVE_DIR, full_history, full_metrics
+from transcript import TranscriptWriter
+from speakers import AGENT_1, AGENT_2, SUMMARIZER, LABELS, speaker_of, message_text, labelled_text
 
-def save_conversation_as_markdown(result, topic, max_turns, include_summary=True):
-    # Create conversation_results directory
-    output_dir = "conversation_results"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+DEFAULT_CHECKPOINT_PATH = "conversation_checkpoints.sqlite"
 
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{output_dir}/conversation_{timestamp}.md"
+def summarize_and_finish(writer, result, topic, include_summary=True, summary=None, summary_metrics=None, hierarchical_summary=False, structured_summary=False):
+    """Write the final summary file, then close the transcript with the run statistics."""
+    if include_summary:
+        # Reuse the graph's summarizer model (same settings) rather than building another client
+        summarizer = ConversationSummarizer(
+            structured=structured_summary, hierarchical=hierarchical_summary, model=get_model(SUMMARIZER)
+        )
+        if summary is None:
+            print("\nGenerating conversation summary...")
+            # Include messages compacted into the archive during long runs
+            summary = summarizer.generate_summary(full_history(result), topic)
+            summary_metrics = summarizer.metrics
+        writer.write_summary(summarizer.format_summary_as_markdown(summary))
 
-    # Build markdown content
-    markdown_content = f"""# AI Agent Conversation
+    # Summary calls are listed with the conversation's own in the performance table
+    writer.finish(result, full_metrics(result) + (summary_metrics or []))
 
-## Metadata
-- **Topic**: {topic}
-- **Date**: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-- **Total Turns**: {result['turn_count']}
-- **Max Turns**: {max_turns}
-- **Agent 1**: GPT-4o
-- **Agent 2**: Perplexity (Llama 3.1 Sonar)
 
----
+def save_conversation_as_markdown(result, topic, max_turns, include_summary=True, summary=None, suffix="", summary_metrics=None, hierarchical_summary=False, structured_summary=False):
+    """Write a finished conversation to markdown, with its summary in a separate file."""
+    writer = TranscriptWriter(topic, max_turns, suffix)
+    writer.add_messages(full_history(result))
+    summarize_and_finish(
+        writer, result, topic, include_summary=include_summary, summary=summary,
+        summary_metrics=summary_metrics, hierarchical_summary=hierarchical_summary,
+        structured_summary=structured_summary
+    )
+    return writer.filename
 
-"""
 
-    # Generate and add summary if requested
-    if include_summary:
-        print("\nGenerating conversation summary...")
-        summarizer = ConversationSummarizer()
-        summary = summarizer.generate_summary(result["messages"], topic)
-        summary_md = summarizer.format_summary_as_markdown(summary)
-        markdown_content += summary_md
-        markdown_content += "---\n\n"
-
-    markdown_content += "## Full Conversation\n\n"
-
-    # Add each message to the markdown
-    turn_number = 0
-    for message in result["messages"]:
-        # Extract agent number from content
-        if "[Agent 1]" in message.content:
-            turn_number += 1
-            agent = "Agent 1 (GPT-4o)"
-            content = message.content.replace("[Agent 1]:", "").strip()
-            markdown_content += f"### Turn {turn_number}: {agent}\n\n"
-            markdown_content += f"{content}\n\n"
-            markdown_content += "---\n\n"
-        elif "[Agent 2]" in message.content:
-            turn_number += 1
-            agent = "Agent 2 (Perplexity)"
-            content = message.content.replace("[Agent 2]:", "").strip()
-            markdown_content += f"### Turn {turn_number}: {agent}\n\n"
-            markdown_content += f"{content}\n\n"
-            markdown_content += "---\n\n"
-        elif "[Summarizer]" in message.content:
-            agent = "Summarizer (GPT-4o)"
-            content = message.content.replace("[Summarizer]:", "").strip()
-            markdown_content += f"### Periodic Summary by {agent}\n\n"
-            markdown_content += f"> {content}\n\n"
-            markdown_content += "---\n\n"
+def run_with_transcript(graph, inputs, config, writer):
+    """Run the graph, appending each node's messages to the transcript as it completes."""
+    result = None
+    for mode, chunk in graph.stream(inputs, config, stream_mode=["updates", "values"]):
+        if mode == "updates":
+            writer.add_updates(chunk)
+        else:
+            result = chunk
+    return result
+
+
+async def arun_with_transcript(graph, inputs, config, writer):
+    """Run the graph asynchronously, appending each node's messages to the transcript as it completes."""
+    result = None
+    async for mode, chunk in graph.astream(inputs, config, stream_mode=["updates", "values"]):
+        if mode == "updates":
+            writer.add_updates(chunk)
+        else:
+            result = chunk
+    return result
+
+NODE_LABELS = {
+    "agent_1": LABELS[AGENT_1],
+    "agent_2": LABELS[AGENT_2],
+    "summarizer": LABELS[SUMMARIZER],
+    "background_summarizer": LABELS[SUMMARIZER]
+}
+
+
+def stream_conversation(inputs, graph=app, config=None, writer=None):
+    """Run the graph, printing tokens as they arrive and time-to-first-token per node.
+
+    A background summary runs in the same step as an agent turn, so output is
+    tracked per node: one node's tokens are printed live under its label and
+    the other's are held back until it finishes, then printed in one piece.
+    With a TranscriptWriter, each node's messages are appended to the transcript as it completes.
+    """
+    timings = []
+    final_state = None
+    # Every node in a step starts when the previous step's values are emitted
+    step_start = time.perf_counter()
+    first_token = {}  # Node -> seconds from step start to its first token
+    held = {}  # Node -> text not printed yet because another node is printing
+    printing = None  # Node whose tokens are printed as they arrive
+
+    for mode, chunk in graph.stream(inputs, config, stream_mode=["messages", "updates", "values"]):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            streamed = isinstance(message, AIMessageChunk)
+            # A non-chunk message is the node's final output; only show it if nothing streamed.
+            # Unnamed ones (per-agent view copies, compaction removals) are never shown.
+            if not streamed and (node in first_token or speaker_of(message) is None):
+                continue
+            if node not in first_token:
+                first_token[node] = time.perf_counter() - step_start
+                if printing is None:
+                    printing = node
+                    print(f"{NODE_LABELS.get(node, node)}: ", end="", flush=True)
+            if streamed:
+                content = message.content if isinstance(message.content, str) else ""
+            else:
+                content = message_text(message)
+            if node == printing:
+                print(content, end="", flush=True)
+            else:
+                held[node] = held.get(node, "") + content
+
+        elif mode == "updates":
+            if writer is not None:
+                writer.add_updates(chunk)
+            for node in chunk:
+                total = time.perf_counter() - step_start
+                ttft = first_token.pop(node, None)
+                if node in held:
+                    print(f"{NODE_LABELS.get(node, node)}: {held.pop(node)}", end="")
+                elif node == printing:
+                    printing = None
+                print(f"\n  ({node}: first token {f'{ttft:.2f}s' if ttft is not None else 'n/a'}, total {total:.2f}s)")
+                print()
+                timings.append({"node": node, "ttft": ttft, "total": total})
+            if printing is None and held:
+                # Carry on live with a node that is still running
+                printing = next(iter(held))
+                print(f"{NODE_LABELS.get(printing, printing)}: {held.pop(printing)}", end="", flush=True)
+
+        elif mode == "values":
+            final_state = chunk
+            step_start = time.perf_counter()
+
+    # Average latency per node, so provider differences are easy to compare
+    print("-" * 70)
+    for node in NODE_LABELS:
+        runs = [t for t in timings if t["node"] == node]
+        ttfts = [t["ttft"] for t in runs if t["ttft"] is not None]
+        if runs:
+            avg_ttft = f"{sum(ttfts) / len(ttfts):.2f}s" if ttfts else "n/a"
+            avg_total = sum(t["total"] for t in runs) / len(runs)
+            print(f"{node}: {len(runs)} calls, avg first token {avg_ttft}, avg total {avg_total:.2f}s")
+    print()
+
+    return final_state
+
+
+def load_batch(path):
+    """Load batch jobs (topic, max_turns, summary_interval, context_window) from a JSONL or CSV file."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    jobs = []
+    for row in rows:
+        jobs.append({
+            "topic": row["topic"],
+            "max_turns": int(row.get("max_turns") or 8),
+            "summary_interval": int(row.get("summary_interval") or 4),
+            "context_window": int(row.get("context_window") or 0)
+        })
+    return jobs
+
+
+def batch_thread_prefix(path: str) -> str:
+    """Thread ID prefix for a batch file: its stem plus a hash of its absolute path."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}"
+
+
+def job_thread_ids(thread_prefix: str, jobs: list, background_summary: bool = False) -> list:
+    """Thread ID per job, derived from its parameters rather than its position.
+
+    Editing or reordering the batch file then never resumes another topic's
+    conversation; identical jobs are told apart by their occurrence count.
+    """
+    seen = {}
+    thread_ids = []
+    for job in jobs:
+        digest = hashlib.sha256(json.dumps({**job, "background_summary": background_summary}, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        seen[digest] = seen.get(digest, 0) + 1
+        thread_ids.append(f"{thread_prefix}-{digest}-{seen[digest]}")
+    return thread_ids
+
+
+async def run_batch(jobs, max_concurrency=None, provider_limits=None, include_summary=True, graph=app, thread_prefix=None, hierarchical_summary=False, structured_summary=False, background_summary=False):
+    """Run many conversations concurrently and save each one as markdown.
+
+    With a checkpointed graph, each job runs on a thread named from
+    thread_prefix and a hash of its parameters (job_thread_ids), so re-running
+    the same batch resumes unfinished conversations and skips finished ones.
+    A conversation counts as finished once its transcript and summary are
+    written; one whose graph completed without them only has those redone.
+
+    Model calls wait for a worker from their provider's pool (provider_limits),
+    so conversations interleave: while one waits on Perplexity, another's
+    agent 1 turn runs on OpenAI. By default as many conversations are in
+    flight as there are workers in all pools, enough to keep each pool busy.
+    """
+    set_provider_limits(provider_limits or {})
+    semaphore = asyncio.Semaphore(max_concurrency or pool_capacity() or 8)
+    thread_ids = job_thread_ids(thread_prefix, jobs, background_summary) if thread_prefix else [uuid4().hex for _ in jobs]
+
+    async def run_job(index, job):
+        """Run one job, returning (final state, turns run now), or None if it had already finished."""
+        async with semaphore:
+            thread_id = thread_ids[index - 1]
+            inputs = {
+                "messages": [],
+                "topic": job["topic"],
+                "current_speaker": "agent_1",
+                "turn_count": 0,
+                "max_turns": job["max_turns"],
+                "summary_interval": job["summary_interval"],
+                "context_window": job["context_window"],
+                "archive_path": f"{ARCHIVE_DIR}/{thread_id}.jsonl" if job["context_window"] else "",
+                "background_summary": background_summary
+            }
+            config = {"recursion_limit": recursion_limit_for(job["max_turns"], job["summary_interval"])}
+            saved = {}
+            if thread_prefix:
+                config["configurable"] = {"thread_id": thread_id}
+                snapshot = await graph.aget_state(config)
+                saved = snapshot.values
+                if saved.get("transcript_path"):
+                    print(f"[{index}] already finished (thread {thread_id}, {saved['transcript_path']}), skipped")
+                    return None
+            writer = TranscriptWriter(job["topic"], job["max_turns"], suffix=f"_{index:05d}")
+            if saved:
+                # Continue from the last completed node
+                inputs = None
+                writer.add_messages(full_history(saved))
+
+            if saved and not snapshot.next:
+                # The graph finished but the run stopped before its files were written
+                result = saved
+            else:
+                result = await arun_with_transcript(graph, inputs, config, writer)
+
+            summary = None
+            summary_metrics = None
+            if include_summary:
+                # The final summary goes to OpenAI, so it holds one of that provider's slots
+                # and sends one request at a time; other conversations keep the pool busy
+                async with provider_slot("openai"):
+                    summarizer = ConversationSummarizer(
+                        max_concurrency=1, structured=structured_summary, hierarchical=hierarchical_summary,
+                        model=get_model(SUMMARIZER)
+                    )
+                    summary = await summarizer.agenerate_summary(full_history(result), job["topic"])
+                summary_metrics = summarizer.metrics
+
+        summarize_and_finish(
+            writer, result, job["topic"], include_summary=include_summary,
+            summary=summary, summary_metrics=summary_metrics
+        )
+        if thread_prefix:
+            # Mark the thread finished only now, so a crash before this point redoes the files.
+            # Every finished state routes agent_1 to END, so this schedules no further nodes.
+            await graph.aupdate_state(config, {"transcript_path": writer.filename}, as_node="agent_1")
+        print(f"[{index}] {result['turn_count']} turns -> {writer.filename}")
+        return result, result["turn_count"] - saved.get("turn_count", 0)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_job(index, job) for index, job in enumerate(jobs, 1)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+
+    results = []
+    skipped = 0
+    total_turns = 0
+    for index, outcome in enumerate(outcomes, 1):
+        if isinstance(outcome, Exception):
+            print(f"[{index}] failed: {outcome!r}")
+        elif outcome is None:
+            skipped += 1
         else:
-            agent = "Unknown"
-            content = message.content
-            markdown_content += f"### {agent}\n\n"
-            markdown_content += f"{content}\n\n"
-            markdown_content += "---\n\n"
+            result, turns_run = outcome
+            results.append(result)
+            # Resumed conversations only count the turns run now
+            total_turns += turns_run
+
+    print()
+    print(f"Completed {len(results)}/{len(jobs) - skipped} conversations in {elapsed:.1f}s" + (f" ({skipped} already finished)" if skipped else ""))
+    print(f"Throughput: {len(results) / elapsed * 60:.2f} conversations/min, {total_turns / elapsed:.2f} turns/sec")
+    print_provider_utilization(elapsed)
+    return results
+
+
+def print_provider_utilization(elapsed: float):
+    """Print how busy each provider's worker pool was over the batch."""
+    for provider, stats in provider_utilization(elapsed).items():
+        workers = f"{stats['workers']} workers" if stats["workers"] else "unbounded"
+        utilization = f"{stats['utilization']:.0%} utilized, " if stats["utilization"] is not None else ""
+        print(
+            f"{provider} ({workers}): {stats['calls']} calls, {utilization}busy {stats['active']:.0%} of the time, "
+            f"avg {stats['avg_in_flight']:.1f} in flight (peak {stats['peak_in_flight']}), avg wait {stats['avg_wait_ms']:.0f} ms"
+        )
+
+
+async def run_batch_with_checkpoints(jobs, checkpoint_path, thread_prefix, **kwargs):
+    """Run a batch on a SQLite-checkpointed graph so interrupted conversations can resume."""
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    async with AsyncSqliteSaver.from_conn_string(checkpoint_path) as saver:
+        return await run_batch(jobs, graph=build_app(saver), thread_prefix=thread_prefix, **kwargs)
+
+
+def print_cache_stats():
+    """Print LLM cache hit/miss counters if the SQLite cache is enabled."""
+    cache = get_llm_cache()
+    if isinstance(cache, SQLiteLRUCache):
+        stats = cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+
+def print_rate_limit_stats():
+    """Print requests, retries and time spent throttled for each API."""
+    for base_url, stats in rate_limit_stats().items():
+        print(f"{base_url}: {stats['requests']} requests, {stats['retries']} retries, {stats['throttled_seconds']:.1f}s throttled")
+
+
+def print_hedge_stats():
+    """Print how often each node's calls were hedged and what it saved, if hedging is on."""
+    if not hedging_enabled():
+        return
+    for node, stats in hedge_stats().items():
+        rate = stats["hedged"] / stats["calls"] if stats["calls"] else 0
+        print(
+            f"{node}: {stats['hedged']}/{stats['calls']} calls hedged ({rate:.0%}), "
+            f"{stats['backup_wins']} won by the duplicate, ~{stats['saved_seconds']:.1f}s saved"
+        )
 
-    # Write to file
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(markdown_content)
 
-    return filename
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run two-agent conversations.")
+    parser.add_argument("--batch", help="JSONL or CSV file of topics (columns: topic, max_turns, summary_interval, context_window)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Maximum conversations in flight (batch mode; default: total provider workers, or 8)")
+    parser.add_argument("--openai-concurrency", type=int, default=None, help="OpenAI worker pool size: maximum concurrent OpenAI calls (batch mode)")
+    parser.add_argument("--perplexity-concurrency", type=int, default=None, help="Perplexity worker pool size: maximum concurrent Perplexity calls (batch mode)")
+    parser.add_argument("--openai-rpm", type=int, default=None, help="OpenAI requests per minute (overrides RATE_LIMITS)")
+    parser.add_argument("--openai-tpm", type=int, default=None, help="OpenAI tokens per minute (overrides RATE_LIMITS)")
+    parser.add_argument("--perplexity-rpm", type=int, default=None, help="Perplexity requests per minute (overrides RATE_LIMITS)")
+    parser.add_argument("--perplexity-tpm", type=int, default=None, help="Perplexity tokens per minute (overrides RATE_LIMITS)")
+    parser.add_argument("--max-turns", type=int, default=8, help="Agent turns in the conversation")
+    parser.add_argument("--context-window", type=int, default=0, help="Agent turns kept verbatim in prompts; older turns are replaced by the latest summary (0 = full history)")
+    parser.add_argument("--background-summary", action="store_true", help="Run periodic summaries in parallel with the next agent turn")
+    parser.add_argument("--stream", action="store_true", help="Print tokens as they arrive and time-to-first-token per node")
+    parser.add_argument("--cache", help="SQLite file for caching LLM responses across runs")
+    parser.add_argument("--cache-max-entries", type=int, default=10000, help="Cached responses kept before LRU eviction")
+    parser.add_argument("--checkpoint", nargs="?", const=DEFAULT_CHECKPOINT_PATH, help=f"Checkpoint every step to this SQLite file (default {DEFAULT_CHECKPOINT_PATH}) so the run can be resumed")
+    parser.add_argument("--resume", metavar="THREAD_ID", help="Resume a checkpointed conversation from its last completed step")
+    parser.add_argument("--no-summary", action="store_true", help="Skip the final summary")
+    parser.add_argument("--hierarchical-summary", action="store_true", help="Build the final summary from the periodic summaries and the turns after the last one")
+    parser.add_argument("--structured-summary", action="store_true", help="Fill the final summary with one structured-output request instead of five")
+    return parser.parse_args()
+
 
 def main():
+    args = parse_args()
+
+    if args.cache:
+        enable_llm_cache(args.cache, max_entries=args.cache_max_entries)
+
+    if any((args.openai_rpm, args.openai_tpm, args.perplexity_rpm, args.perplexity_tpm)):
+        configure_rate_limits({
+            DEFAULT_BASE_URL: {"rpm": args.openai_rpm, "tpm": args.openai_tpm},
+            PERPLEXITY_BASE_URL: {"rpm": args.perplexity_rpm, "tpm": args.perplexity_tpm}
+        })
+
+    if args.batch:
+        jobs = load_batch(args.batch)
+        print(f"Running {len(jobs)} conversations from {args.batch}")
+        batch_options = {
+            "max_concurrency": args.concurrency,
+            "provider_limits": {"openai": args.openai_concurrency, "perplexity": args.perplexity_concurrency},
+            "include_summary": not args.no_summary,
+            "hierarchical_summary": args.hierarchical_summary,
+            "structured_summary": args.structured_summary,
+            "background_summary": args.background_summary
+        }
+        if args.checkpoint:
+            thread_prefix = batch_thread_prefix(args.batch)
+            asyncio.run(run_batch_with_checkpoints(jobs, args.checkpoint, thread_prefix, **batch_options))
+        else:
+            asyncio.run(run_batch(jobs, **batch_options))
+        print_cache_stats()
+        print_rate_limit_stats()
+        print_hedge_stats()
+        return
+
+    if args.checkpoint or args.resume:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        with SqliteSaver.from_conn_string(args.checkpoint or DEFAULT_CHECKPOINT_PATH) as saver:
+            thread_id = args.resume or uuid4().hex
+            run_conversation(args, build_app(saver), {"configurable": {"thread_id": thread_id}})
+    else:
+        run_conversation(args, app, {})
+
+
+def run_conversation(args, graph, config):
+    """Run (or resume) a single conversation and save it as markdown."""
     print("=" * 70)
     print("TWO-AGENT CONVERSATION SYSTEM TEST\nAgent 1: GPT-4o\nAgent 2: Perplexity (Llama 3.1 Sonar)")
     print("=" * 70)
@@ -88,38 +427,86 @@ def main():
 
     # Set up the conversation
     topic = "How AI can help address educational inequalities?"
-    max_turns = 8
+    max_turns = args.max_turns
     summary_interval = 4  
+    context_window = args.context_window
+    archive_path = ""
+    if context_window:
+        # Long runs move messages the agents no longer see out of the graph state
+        run_id = config["configurable"]["thread_id"] if "configurable" in config else datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive_path = f"{ARCHIVE_DIR}/{run_id}.jsonl"
+
+    if args.resume:
+        saved = graph.get_state(config).values
+        if not saved:
+            print(f"No checkpoint found for thread {args.resume}")
+            return
+        topic = saved["topic"]
+        max_turns = saved["max_turns"]
+        summary_interval = saved["summary_interval"]
+        context_window = saved.get("context_window", 0)
 
+    config = {**config, "recursion_limit": recursion_limit_for(max_turns, summary_interval)}
+    if "configurable" in config:
+        thread_id = config["configurable"]["thread_id"]
+        print(f"Thread ID: {thread_id} (resume with --resume {thread_id})")
     print(f"Topic: {topic}")
     print(f"Max turns: {max_turns}")
     print(f"Summary interval: Every {summary_interval} turns")
+    if context_window:
+        print(f"Context window: Last {context_window} turns")
     print()
     print("-" * 70)
     print()
 
-    # Run the conversation
-    result = app.invoke({
+    inputs = {
         "messages": [],
         "topic": topic,
         "current_speaker": "agent_1",
         "turn_count": 0,
         "max_turns": max_turns,
-        "summary_interval": summary_interval
-    })
+        "summary_interval": summary_interval,
+        "context_window": context_window,
+        "archive_path": archive_path,
+        "background_summary": args.background_summary
+    }
+
+    # Turns are appended to the transcript as each node completes
+    writer = TranscriptWriter(topic, max_turns)
+    print(f"Writing transcript to: {writer.filename}")
+    print()
+
+    if args.resume:
+        # Continue from the last completed node; finished steps are not re-run
+        inputs = None
+        writer.add_messages(full_history(saved))
+
+    # Run the conversation
+    if args.stream:
+        result = stream_conversation(inputs, graph, config, writer)
+    else:
+        result = run_with_transcript(graph, inputs, config, writer)
 
-    # Print the conversation
-    for message in result["messages"]:
-        print(message.content)
-        print()
-        print("-" * 70)
-        print()
+        # Print the conversation
+        for message in full_history(result):
+            print(labelled_text(message))
+            print()
+            print("-" * 70)
+            print()
 
     print(f"Conversation completed after {result['turn_count']} turns.")
 
-    # Save to markdown
-    filename = save_conversation_as_markdown(result, topic, max_turns)
-    print(f"\nConversation saved to: {filename}")
+    # Summary goes to its own file; the transcript is closed with the run statistics
+    summarize_and_finish(
+        writer, result, topic,
+        include_summary=not args.no_summary, hierarchical_summary=args.hierarchical_summary,
+        structured_summary=args.structured_summary
+    )
+    print(f"\nConversation saved to: {writer.filename}")
+    if not args.no_summary:
+        print(f"Summary saved to: {writer.summary_filename}")
+    print_cache_stats()
+    print_hedge_stats()
     print()
 
 if __name__ == "__main__":
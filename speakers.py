@@ -0,0 +1,61 @@
+"""
+Speaker identity for conversation messages.
+Graph nodes store who said what in the message's `name` field and keep the
+content free of labels; every consumer asks speaker_of()/message_text()
+instead of parsing "[Agent N]:" prefixes. Messages from older runs (archives,
+checkpoints) that still carry a text prefix are recognised as a fallback.
+"""
+
+import re
+
+AGENT_1 = "agent_1"
+AGENT_2 = "agent_2"
+SUMMARIZER = "summarizer"
+
+# Labels used when a conversation is rendered as plain text
+LABELS = {
+    AGENT_1: "[Agent 1]",
+    AGENT_2: "[Agent 2]",
+    SUMMARIZER: "[Summarizer]"
+}
+
+DISPLAY_NAMES = {
+    AGENT_1: "Agent 1",
+    AGENT_2: "Agent 2",
+    SUMMARIZER: "Summarizer"
+}
+
+# Any label in model output, and the one a model sometimes opens its own turn with
+SPEAKER_LABEL = re.compile(r'\[(?:Agent \d|Summarizer)\]')
+LEADING_AGENT_LABEL = re.compile(r'^\s*\[Agent \d\]:\s*')
+
+_LEGACY_PREFIX = re.compile(r'^\[(Agent 1|Agent 2|Summarizer)\]:\s*')
+_LEGACY_SPEAKERS = {"Agent 1": AGENT_1, "Agent 2": AGENT_2, "Summarizer": SUMMARIZER}
+
+
+def speaker_of(message):
+    """Return the speaker id (agent_1, agent_2, summarizer) of a message, or None."""
+    if message.name in LABELS:
+        return message.name
+    match = _LEGACY_PREFIX.match(message.content) if isinstance(message.content, str) else None
+    return _LEGACY_SPEAKERS[match.group(1)] if match else None
+
+
+def message_text(message) -> str:
+    """Return a message's content without any legacy speaker prefix."""
+    if message.name in LABELS:
+        return message.content
+    return _LEGACY_PREFIX.sub('', message.content, count=1).strip()
+
+
+def summary_turn(message):
+    """Return the agent turn a periodic summary was written after, if it was recorded."""
+    return (message.response_metadata or {}).get("turn")
+
+
+def labelled_text(message) -> str:
+    """Render a message as "[Speaker]: text" for plain-text prompts."""
+    speaker = speaker_of(message)
+    if speaker is None:
+        return message.content
+    return f"{LABELS[speaker]}: {message_text(message)}"
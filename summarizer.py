@@ -3,53 +3,279 @@ Conversation summarizer module for generating insights from agent conversations.
 """
 
 import os
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+import asyncio
+import hashlib
+from models import create_chat_model, register_model, get_model
+from http_clients import run_coroutine
+from model_calls import ainvoke_model
+from speakers import SUMMARIZER, DISPLAY_NAMES, speaker_of, message_text, labelled_text, summary_turn
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field, ValidationError
+
+FINAL_SUMMARY_MODEL = "final_summary"
+
+
+def _build_final_summary_model():
+    return create_chat_model(
+        model="gpt-4o-mini",
+        api_key=os.getenv("OPENAI_API_KEY"),
+        temperature=0.3
+    )
+
+
+# Built on first use and shared by every summarizer instance
+register_model(FINAL_SUMMARY_MODEL, _build_final_summary_model)
+
+# Chunk summaries by (model, topic, chunk) hash, shared by every summarizer instance so
+# re-summarizing a grown conversation only maps its new chunks; oldest entries go first
+_chunk_cache = {}
+CHUNK_CACHE_MAX_ENTRIES = 10000
+
+
+class MainArguments(BaseModel):
+    """Main argument or perspective of each agent."""
+    agent_1: str = Field(description="Agent 1's main argument or perspective")
+    agent_2: str = Field(description="Agent 2's main argument or perspective")
+
+
+class StructuredSummary(BaseModel):
+    """Schema for the single-request final summary."""
+    executive_summary: str = Field(description="2-3 sentence executive summary of the main focus and outcome")
+    key_points: list[str] = Field(description="5-7 key insights, solutions, or perspectives discussed")
+    main_arguments: MainArguments
+    conclusions: str = Field(description="3-4 sentence conclusion with areas of agreement and actionable takeaways")
+    topics_discussed: list[str] = Field(description="4-6 specific sub-topics or themes discussed")
 
-load_dotenv()
 
 class ConversationSummarizer:
     """Generates summaries and insights from agent conversations."""
 
-    def __init__(self):
-        self.model = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=0.3  
-        )
+    def __init__(self, max_concurrency: int = 5, structured: bool = False, hierarchical: bool = False,
+                 max_input_tokens: int = 100000, chunk_tokens: int = 8000, model=None):
+        # Any chat model can be injected; by default one shared gpt-4o-mini client is used
+        self.model = model if model is not None else get_model(FINAL_SUMMARY_MODEL)
+        # Upper bound on summary requests in flight at once
+        self.max_concurrency = max_concurrency
+        # Fill the whole summary with one structured-output request instead of five
+        self.structured = structured
+        # Build the report from the periodic summaries plus the turns after the last one
+        self.hierarchical = hierarchical
+        # Longer conversations are summarized in chunk_tokens pieces first (map-reduce)
+        self.max_input_tokens = max_input_tokens
+        self.chunk_tokens = chunk_tokens
+        # Chunk summaries, shared across instances (see _chunk_cache)
+        self._chunk_cache = _chunk_cache
+        # Timing/token records for the calls of the most recent summary
+        self.metrics = []
 
     def generate_summary(self, messages: list, topic: str) -> dict:
-       
+        """Generate the final summary, running the component requests concurrently."""
+        # One persistent loop keeps pooled async connections reusable between calls,
+        # including from code that is already inside an event loop (e.g. a notebook)
+        return run_coroutine(self.agenerate_summary(messages, topic))
+
+    async def agenerate_summary(self, messages: list, topic: str) -> dict:
+        """Generate all summary components concurrently with ainvoke."""
         # Extract conversation text
-        conversation_text = self._format_conversation(messages)
-
-        # Generate different summary components
-        summary = {
-            "executive_summary": self._generate_executive_summary(conversation_text, topic),
-            "key_points": self._extract_key_points(conversation_text, topic),
-            "main_arguments": self._extract_arguments(conversation_text, topic),
-            "conclusions": self._generate_conclusions(conversation_text, topic),
-            "topics_discussed": self._extract_topics(conversation_text, topic)
+        if self.hierarchical:
+            parts = self._hierarchical_parts(messages)
+        else:
+            parts = self._format_turns(messages)
+        conversation_text = "\n\n".join(parts)
+        self.metrics = []
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        if self._estimate_tokens(conversation_text) > self.max_input_tokens:
+            # Map-reduce over the same input, so a hierarchical report chunks its summaries and recent turns
+            conversation_text = await self._map_reduce_conversation(parts, topic, semaphore)
+
+        if self.structured:
+            summary = await self._agenerate_structured_summary(conversation_text, topic)
+            if summary is not None:
+                return summary
+
+        async def run_component(name, prompt, parse):
+            async with semaphore:
+                response, record = await ainvoke_model(self.model, prompt, f"final_summary:{name}")
+            self.metrics.append(record)
+            return parse(response)
+
+        components = self._summary_components(conversation_text, topic)
+        results = await asyncio.gather(*(
+            run_component(name, prompt, parse) for name, (prompt, parse) in components.items()
+        ))
+
+        return dict(zip(components, results))
+
+    async def _map_reduce_conversation(self, turns: list, topic: str, semaphore: asyncio.Semaphore) -> str:
+        """Condense a transcript too large for one request into ordered chunk summaries.
+
+        Chunks are summarized concurrently; if the joined summaries are still
+        over max_input_tokens, they are chunked and summarized again.
+        """
+        parts = turns
+        while True:
+            chunks = self._chunk_parts(parts)
+            summaries = await asyncio.gather(*(
+                self._summarize_chunk(chunk, topic, semaphore) for chunk in chunks
+            ))
+            parts = [f"Part {i}: {summary}" for i, summary in enumerate(summaries, 1)]
+            conversation = "Summaries of consecutive parts of the conversation, in order:\n\n" + "\n\n".join(parts)
+            if len(chunks) == 1 or self._estimate_tokens(conversation) <= self.max_input_tokens:
+                return conversation
+
+    def _chunk_parts(self, parts: list) -> list:
+        """Group consecutive parts into chunks of at most chunk_tokens.
+
+        Chunks are filled from the start, so appending turns leaves every
+        earlier full chunk - and its cache entry - unchanged.
+        """
+        chunks = []
+        current = []
+        size = 0
+        for part in parts:
+            tokens = self._estimate_tokens(part)
+            if current and size + tokens > self.chunk_tokens:
+                chunks.append("\n\n".join(current))
+                current = []
+                size = 0
+            current.append(part)
+            size += tokens
+        if current:
+            chunks.append("\n\n".join(current))
+        return chunks
+
+    async def _summarize_chunk(self, chunk: str, topic: str, semaphore: asyncio.Semaphore) -> str:
+        """Summarize one chunk, reusing the result for a chunk seen before."""
+        model_name = getattr(self.model, "model_name", None) or type(self.model).__name__
+        key = hashlib.sha256(f"{model_name}\x00{topic}\x00{chunk}".encode("utf-8")).hexdigest()
+        if key not in self._chunk_cache:
+            async with semaphore:
+                response, record = await ainvoke_model(
+                    self.model, self._chunk_summary_prompt(chunk, topic), "final_summary:chunk"
+                )
+            self.metrics.append(record)
+            if len(self._chunk_cache) >= CHUNK_CACHE_MAX_ENTRIES:
+                del self._chunk_cache[next(iter(self._chunk_cache))]
+            self._chunk_cache[key] = self._parse_text(response)
+        return self._chunk_cache[key]
+
+    def _estimate_tokens(self, text: str) -> int:
+        # Roughly four characters per token for English text
+        return len(text) // 4
+
+    async def _agenerate_structured_summary(self, conversation: str, topic: str):
+        """Fill every summary field with one request; None if the output fails to parse."""
+        try:
+            structured_model = self.model.with_structured_output(StructuredSummary, include_raw=True)
+        except NotImplementedError:
+            return None
+
+        try:
+            result, record = await ainvoke_model(
+                structured_model, self._structured_summary_prompt(conversation, topic), "final_summary:structured"
+            )
+        except (OutputParserException, ValidationError):
+            return None
+
+        self.metrics.append(record)
+        if result["parsing_error"] is not None or result["parsed"] is None:
+            return None
+        return result["parsed"].model_dump()
+
+    def _summary_components(self, conversation: str, topic: str) -> dict:
+        """Map each summary field to its (prompt messages, response parser) pair."""
+        return {
+            "executive_summary": (self._executive_summary_prompt(conversation, topic), self._parse_text),
+            "key_points": (self._key_points_prompt(conversation, topic), self._parse_key_points),
+            "main_arguments": (self._arguments_prompt(conversation, topic), self._parse_arguments),
+            "conclusions": (self._conclusions_prompt(conversation, topic), self._parse_text),
+            "topics_discussed": (self._topics_prompt(conversation, topic), self._parse_topics)
         }
 
-        return summary
-
-    def _format_conversation(self, messages: list) -> str:
-        """Format messages into readable conversation text."""
+    def _format_turns(self, messages: list, start: int = 1) -> list:
+        """Format each message as one numbered turn."""
         conversation = []
-        for i, msg in enumerate(messages, 1):
-            content = msg.content
-            # Remove agent labels for cleaner processing
-            if "[Agent 1]:" in content:
-                content = content.replace("[Agent 1]:", "Agent 1:").strip()
-            elif "[Agent 2]:" in content:
-                content = content.replace("[Agent 2]:", "Agent 2:").strip()
+        for i, msg in enumerate(messages, start):
+            speaker = speaker_of(msg)
+            # Agents are named plainly; periodic summaries keep their label
+            if speaker == SUMMARIZER or speaker is None:
+                content = labelled_text(msg)
+            else:
+                content = f"{DISPLAY_NAMES[speaker]}: {message_text(msg)}"
             conversation.append(f"Turn {i}: {content}")
 
-        return "\n\n".join(conversation)
+        return conversation
+
+    def _hierarchical_parts(self, messages: list) -> list:
+        """Periodic summaries and only the turns after the last one, as parts with headings.
+
+        Each periodic summary already condenses the turns before it, so the
+        report's input grows with the number of summaries, not the transcript.
+        Falls back to the full conversation when there are no summaries yet.
+        """
+        summary_indexes = [i for i, msg in enumerate(messages) if speaker_of(msg) == SUMMARIZER]
+        if not summary_indexes:
+            return self._format_turns(messages)
+
+        last = summary_indexes[-1]
+        turns = [msg for msg in messages if speaker_of(msg) != SUMMARIZER]
+        # A background summary is stored after the turn that ran alongside it, so
+        # coverage comes from its recorded turn; older runs fall back to position
+        turns_covered = summary_turn(messages[last])
+        if turns_covered is None:
+            turns_covered = sum(1 for msg in messages[:last] if speaker_of(msg) != SUMMARIZER)
+        summaries = [
+            f"Summary {n}: {message_text(messages[i])}"
+            for n, i in enumerate(summary_indexes, 1)
+        ]
+        parts = [f"Periodic summaries of turns 1-{turns_covered}:"] + summaries
+
+        recent = turns[turns_covered:]
+        if recent:
+            parts += ["Turns since the last summary:"] + self._format_turns(recent, start=turns_covered + 1)
+        return parts
+
+    def _structured_summary_prompt(self, conversation: str, topic: str) -> list:
+        system_prompt = """You are an expert at summarizing and analyzing academic discussions.
+Produce a complete structured summary of the conversation."""
+
+        user_prompt = f"""Topic: {topic}
+
+Conversation:
+{conversation}
+
+Summarize this discussion with:
+- executive_summary: 2-3 sentences capturing the main focus and outcome
+- key_points: 5-7 key insights, solutions, or perspectives discussed
+- main_arguments: the main argument or perspective of Agent 1 and of Agent 2
+- conclusions: 3-4 sentences synthesizing the main insights, areas of agreement, and actionable takeaways
+- topics_discussed: 4-6 specific sub-topics or themes"""
+
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
 
-    def _generate_executive_summary(self, conversation: str, topic: str) -> str:
+    def _chunk_summary_prompt(self, chunk: str, topic: str) -> list:
+        system_prompt = """You are an expert at summarizing academic discussions.
+Summarize one part of a longer conversation so it can be combined with summaries of the other parts."""
+
+        user_prompt = f"""Topic: {topic}
+
+Conversation part:
+{chunk}
+
+Summarize this part in one paragraph. Keep each agent's main arguments, any agreements or
+disagreements, and specific proposals or examples, attributed to Agent 1 or Agent 2."""
+
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+
+    def _executive_summary_prompt(self, conversation: str, topic: str) -> list:
         system_prompt = """You are an expert at summarizing academic discussions.
 Generate a concise executive summary (2-3 sentences) that captures the essence of the conversation."""
 
@@ -60,14 +286,12 @@ Conversation:
 
 Provide a 2-3 sentence executive summary that captures the main focus and outcome of this discussion."""
 
-        response = self.model.invoke([
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
-
-        return response.content.strip()
+        ]
 
-    def _extract_key_points(self, conversation: str, topic: str) -> list:
+    def _key_points_prompt(self, conversation: str, topic: str) -> list:
         system_prompt = """You are an expert at extracting key insights from discussions.
 Identify the most important points made during the conversation."""
 
@@ -79,19 +303,12 @@ Conversation:
 Extract 5-7 key points from this conversation. Format as a bulleted list.
 Focus on important insights, solutions, or perspectives discussed."""
 
-        response = self.model.invoke([
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
-
-        # Parse response into list
-        points = response.content.strip().split('\n')
-        # Clean up bullet points
-        points = [p.strip('- •*').strip() for p in points if p.strip()]
-        return points
+        ]
 
-    def _extract_arguments(self, conversation: str, topic: str) -> dict:
-        """Extract main arguments from both agents."""
+    def _arguments_prompt(self, conversation: str, topic: str) -> list:
         system_prompt = """You are an expert at analyzing arguments in discussions.
 Identify the main arguments or perspectives from each agent."""
 
@@ -105,29 +322,12 @@ Format as:
 Agent 1: [main argument/perspective]
 Agent 2: [main argument/perspective]"""
 
-        response = self.model.invoke([
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
-
-        # Parse response
-        content = response.content.strip()
-        lines = content.split('\n')
-
-        arguments = {
-            "agent_1": "",
-            "agent_2": ""
-        }
+        ]
 
-        for line in lines:
-            if line.startswith("Agent 1"):
-                arguments["agent_1"] = line.replace("Agent 1:", "").strip()
-            elif line.startswith("Agent 2"):
-                arguments["agent_2"] = line.replace("Agent 2:", "").strip()
-
-        return arguments
-
-    def _generate_conclusions(self, conversation: str, topic: str) -> str:
+    def _conclusions_prompt(self, conversation: str, topic: str) -> list:
         system_prompt = """You are an expert at synthesizing insights from discussions.
 Generate conclusions that capture what was learned or agreed upon."""
 
@@ -139,14 +339,12 @@ Conversation:
 Generate a conclusion paragraph (3-4 sentences) that synthesizes the main insights,
 areas of agreement, and any actionable takeaways from this discussion."""
 
-        response = self.model.invoke([
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
-
-        return response.content.strip()
+        ]
 
-    def _extract_topics(self, conversation: str, topic: str) -> list:
+    def _topics_prompt(self, conversation: str, topic: str) -> list:
         system_prompt = """You are an expert at identifying themes in discussions.
 Extract the specific sub-topics or themes that were discussed."""
 
@@ -158,11 +356,40 @@ Conversation:
 List 4-6 specific sub-topics or themes that were discussed in this conversation.
 Format as a simple list, one per line."""
 
-        response = self.model.invoke([
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
-        ])
+        ]
+
+    def _parse_text(self, response) -> str:
+        return response.content.strip()
+
+    def _parse_key_points(self, response) -> list:
+        # Parse response into list
+        points = response.content.strip().split('\n')
+        # Clean up bullet points
+        points = [p.strip('- •*').strip() for p in points if p.strip()]
+        return points
+
+    def _parse_arguments(self, response) -> dict:
+        # Parse response
+        content = response.content.strip()
+        lines = content.split('\n')
+
+        arguments = {
+            "agent_1": "",
+            "agent_2": ""
+        }
+
+        for line in lines:
+            if line.startswith("Agent 1"):
+                arguments["agent_1"] = line.replace("Agent 1:", "").strip()
+            elif line.startswith("Agent 2"):
+                arguments["agent_2"] = line.replace("Agent 2:", "").strip()
+
+        return arguments
 
+    def _parse_topics(self, response) -> list:
         # Parse response into list
         topics = response.content.strip().split('\n')
         topics = [t.strip('- •*0123456789.').strip() for t in topics if t.strip()]
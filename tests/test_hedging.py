@@ -0,0 +1,108 @@
+"""
+Offline checks of the hedged-call race: winner choice, failures and cancellation.
+Run from the repository root with `python -m pytest tests`.
+"""
+
+import asyncio
+import time
+import pytest
+from langchain_core.messages import HumanMessage
+import hedging
+from fake_chat_model import DeterministicFakeChatModel
+from model_calls import ainvoke_model
+
+MESSAGES = [HumanMessage(content="Discuss hedged requests.")]
+
+
+class FailingFakeChatModel(DeterministicFakeChatModel):
+    """Fake model that raises after its latency."""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        raise RuntimeError(f"{self.model_name} failed")
+
+
+class TrackedFakeChatModel(DeterministicFakeChatModel):
+    """Fake model that notes whether its request was cancelled."""
+
+    cancelled: bool = False
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def _acall(node):
+    async def acall(model, on_first_token=None, extra_config=None):
+        return await ainvoke_model(model, MESSAGES, node, extra_config, on_first_token=on_first_token)
+    return acall
+
+
+def _hedge(monkeypatch, node, model, backup_model, deadline_ms=50):
+    monkeypatch.setattr(hedging, "HEDGE_DEADLINE_MS", deadline_ms)
+    return asyncio.run(hedging.ahedged_call(node, _acall(node), model, backup_model))
+
+
+def _fake(model_name, latency_ms, cls=DeterministicFakeChatModel):
+    return cls(model_name=model_name, latency_ms=latency_ms)
+
+
+def test_fast_call_is_not_hedged(monkeypatch):
+    response, record = _hedge(monkeypatch, "fast", _fake("primary", 0), _fake("fallback", 0))
+
+    assert response.response_metadata["model_name"] == "primary"
+    assert not record.get("hedged")
+    assert hedging.hedge_stats()["fast"] == {"calls": 1, "hedged": 0, "backup_wins": 0, "saved_seconds": 0.0}
+
+
+def test_fallback_wins_and_primary_is_cancelled(monkeypatch):
+    primary = _fake("primary", 1000, TrackedFakeChatModel)
+    start = time.perf_counter()
+    response, record = _hedge(monkeypatch, "slow_primary", primary, _fake("fallback", 0))
+
+    assert time.perf_counter() - start < 0.5
+    assert response.response_metadata["model_name"] == "fallback"
+    assert record["hedged"] and record["hedge_won"]
+    assert primary.cancelled
+    # Wall time is the fallback's own; the race includes the wait before it was sent
+    assert record["wall_ms"] < 50 <= record["hedge_race_ms"]
+    assert hedging.hedge_stats()["slow_primary"]["backup_wins"] == 1
+
+
+def test_primary_wins_when_it_answers_first(monkeypatch):
+    fallback = _fake("fallback", 1000, TrackedFakeChatModel)
+    response, record = _hedge(monkeypatch, "slow_fallback", _fake("primary", 100), fallback)
+
+    assert response.response_metadata["model_name"] == "primary"
+    assert record["hedged"] and not record["hedge_won"]
+    assert fallback.cancelled
+
+
+def test_failed_request_drops_out_of_the_race(monkeypatch):
+    response, record = _hedge(
+        monkeypatch, "failing_primary", _fake("primary", 100, FailingFakeChatModel), _fake("fallback", 200)
+    )
+
+    assert response.response_metadata["model_name"] == "fallback"
+    assert record["hedge_won"]
+
+
+def test_both_failing_raises_the_primary_error(monkeypatch):
+    with pytest.raises(RuntimeError, match="primary failed"):
+        _hedge(
+            monkeypatch, "both_failing",
+            _fake("primary", 100, FailingFakeChatModel), _fake("fallback", 100, FailingFakeChatModel)
+        )
+
+
+def test_sync_call_is_hedged_on_the_background_loop(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_DEADLINE_MS", 50)
+    node = "sync_call"
+    primary = _fake("primary", 1000)
+    response, record = hedging.hedged_call(node, lambda model: None, _acall(node), primary, _fake("fallback", 0))
+
+    assert response.response_metadata["model_name"] == "fallback"
+    assert record["hedge_won"]
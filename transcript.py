@@ -0,0 +1,117 @@
+"""
+Incremental markdown transcripts for agent conversations.
+Turns are appended to the file as graph nodes complete, so a long run keeps
+a readable partial transcript if the process dies and never holds the whole
+document in memory. The final summary is written to its own file.
+"""
+
+import os
+from datetime import datetime
+from langchain_core.messages import RemoveMessage
+from speakers import AGENT_1, AGENT_2, SUMMARIZER, speaker_of, message_text
+
+OUTPUT_DIR = "conversation_results"
+
+
+def format_metrics_as_markdown(metrics):
+    """Render per-call latency and token usage as a markdown table with totals."""
+    lines = [
+        "### Performance\n\n",
+        "| Turn | Node | Model | Wall (ms) | First token (ms) | Throttled (ms) | Input tokens | Cached tokens | Output tokens |\n",
+        "|---|---|---|---|---|---|---|---|---|\n"
+    ]
+    for record in metrics:
+        ttft = f"{record['ttft_ms']:.0f}" if record.get("ttft_ms") is not None else "-"
+        lines.append(
+            f"| {record.get('turn', '-')} | {record['node']} | {record.get('model') or '-'} | {record['wall_ms']:.0f} "
+            f"| {ttft} | {record.get('throttled_ms', 0):.0f} | {record['input_tokens']} | {record.get('cached_tokens', 0)} | {record['output_tokens']} |\n"
+        )
+
+    total_wall = sum(record["wall_ms"] for record in metrics)
+    total_throttled = sum(record.get("throttled_ms", 0) for record in metrics)
+    total_input = sum(record["input_tokens"] for record in metrics)
+    total_cached = sum(record.get("cached_tokens", 0) for record in metrics)
+    total_output = sum(record["output_tokens"] for record in metrics)
+    lines.append(f"| **Total** | {len(metrics)} calls | | {total_wall:.0f} | | {total_throttled:.0f} | {total_input} | {total_cached} | {total_output} |\n\n")
+    return "".join(lines)
+
+
+def format_message_as_markdown(message, turn_number: int):
+    """Render one conversation message, returning (markdown, updated turn number)."""
+    speaker = speaker_of(message)
+    if speaker == AGENT_1:
+        turn_number += 1
+        content = message_text(message)
+        heading = f"### Turn {turn_number}: Agent 1 (GPT-4o)"
+    elif speaker == AGENT_2:
+        turn_number += 1
+        content = message_text(message)
+        heading = f"### Turn {turn_number}: Agent 2 (Perplexity)"
+    elif speaker == SUMMARIZER:
+        content = "> " + message_text(message)
+        heading = "### Periodic Summary by Summarizer (GPT-4o)"
+    else:
+        content = message.content
+        heading = "### Unknown"
+    return f"{heading}\n\n{content}\n\n---\n\n", turn_number
+
+
+class TranscriptWriter:
+    """Append a conversation to its markdown file one message at a time."""
+
+    def __init__(self, topic: str, max_turns: int, suffix: str = ""):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.filename = f"{OUTPUT_DIR}/conversation_{timestamp}{suffix}.md"
+        self.summary_filename = f"{OUTPUT_DIR}/conversation_{timestamp}{suffix}_summary.md"
+        self.topic = topic
+        self.turn_number = 0
+        self._file = open(self.filename, "w", encoding="utf-8")
+        self._write(f"""# AI Agent Conversation
+
+## Metadata
+- **Topic**: {topic}
+- **Date**: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+- **Max Turns**: {max_turns}
+- **Agent 1**: GPT-4o
+- **Agent 2**: Perplexity (Llama 3.1 Sonar)
+
+---
+
+## Full Conversation
+
+""")
+
+    def _write(self, text: str) -> None:
+        # Flush every write so the file is complete up to the last finished node
+        self._file.write(text)
+        self._file.flush()
+
+    def add_messages(self, messages: list) -> None:
+        """Append messages to the transcript, skipping compaction removals."""
+        for message in messages:
+            if isinstance(message, RemoveMessage):
+                continue
+            markdown, self.turn_number = format_message_as_markdown(message, self.turn_number)
+            self._write(markdown)
+
+    def add_updates(self, chunk: dict) -> None:
+        """Append the messages from one stream_mode="updates" chunk."""
+        for update in chunk.values():
+            if isinstance(update, dict):
+                self.add_messages(update.get("messages", []))
+
+    def finish(self, result: dict, metrics: list) -> None:
+        """Append the run statistics and close the transcript."""
+        self._write(f"## Run Statistics\n\n- **Total Turns**: {result['turn_count']}\n\n")
+        if metrics:
+            self._write(format_metrics_as_markdown(metrics))
+        self._file.close()
+
+    def write_summary(self, summary_markdown: str) -> None:
+        """Write the final summary to its own file, replacing it atomically."""
+        temp_filename = f"{self.summary_filename}.tmp"
+        with open(temp_filename, "w", encoding="utf-8") as f:
+            f.write(f"# Conversation Summary\n\n- **Topic**: {self.topic}\n- **Transcript**: {os.path.basename(self.filename)}\n\n")
+            f.write(summary_markdown)
+        os.replace(temp_filename, self.summary_filename)